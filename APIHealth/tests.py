@@ -1,16 +1,23 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.urls import reverse
 from django.http import JsonResponse, HttpResponse
 
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 
-from .models import *  # Import any models if they exist
-from .views import *   # Import views
+import re
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 User = get_user_model()
 
+# Terms that must never appear in a health check response
+SENSITIVE_TERMS_RE = re.compile(
+    r'password|secret|key|token|database_url|private|confidential', re.IGNORECASE
+)
+
 
 class APIHealthModelTest(TestCase):
     """Test any models in APIHealth app (if they exist)"""
@@ -28,6 +35,18 @@ class APIHealthViewTest(APITestCase):
     def setUp(self):
         self.client = APIClient()
 
+    def test_liveness_endpoint(self):
+        """Test liveness endpoint returns a plain ok without dependencies"""
+        response = self.client.get('/-/alive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'ok')
+
+        # Many load balancers probe with HEAD
+        self.assertEqual(self.client.head('/-/alive/').status_code, 200)
+
+        post_response = self.client.post('/-/alive/')
+        self.assertEqual(post_response.status_code, 405)
+
     def test_health_check_endpoint(self):
         """Test main health check endpoint"""
         endpoints_to_try = [
@@ -142,18 +161,19 @@ class APIHealthViewTest(APITestCase):
     def test_database_health_check(self):
         """Test database connectivity in health check"""
         try:
-            # Create a test user to verify database connectivity
-            test_user = User.objects.create_user(
-                username='health_test_user',
-                email='health@test.com',
-                role='buyer'
-            )
-            
-            # If user creation succeeds, database is healthy
-            self.assertIsNotNone(test_user.id)
-            
-            # Clean up
-            test_user.delete()
+            with transaction.atomic():
+                # Create a test user to verify database connectivity
+                test_user = User.objects.create_user(
+                    username='health_test_user',
+                    email='health@test.com',
+                    role='buyer'
+                )
+                
+                # If user creation succeeds, database is healthy
+                self.assertIsNotNone(test_user.id)
+                
+                # Roll back instead of issuing a DELETE
+                transaction.set_rollback(True)
             
             # This confirms database is accessible
             self.assertTrue(True)
@@ -246,15 +266,19 @@ class APIHealthViewTest(APITestCase):
 class APIHealthIntegrationTest(APITestCase):
     """Integration tests for API health monitoring"""
     
-    def setUp(self):
-        self.client = APIClient()
-        self.admin_user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        # Created once per class and rolled back at teardown
+        cls.admin_user = User.objects.create_user(
             username='admin',
             email='admin@test.com',
             password='testpass123',
             role='admin'
         )
 
+    def setUp(self):
+        self.client = APIClient()
+
     def test_health_check_with_authentication(self):
         """Test health check behavior with authenticated user"""
         self.client.force_authenticate(user=self.admin_user)
@@ -354,18 +378,19 @@ class APIHealthIntegrationTest(APITestCase):
             user_count = User.objects.count()
             self.assertGreaterEqual(user_count, 0)
             
-            # Test that we can create and retrieve data
-            test_user = User.objects.create_user(
-                username='system_test_user',
-                email='system@test.com',
-                role='buyer'
-            )
-            
-            retrieved_user = User.objects.get(id=test_user.id)
-            self.assertEqual(test_user.id, retrieved_user.id)
-            
-            # Clean up
-            test_user.delete()
+            with transaction.atomic():
+                # Test that we can create and retrieve data
+                test_user = User.objects.create_user(
+                    username='system_test_user',
+                    email='system@test.com',
+                    role='buyer'
+                )
+                
+                retrieved_user = User.objects.get(id=test_user.id)
+                self.assertEqual(test_user.id, retrieved_user.id)
+                
+                # Roll back instead of issuing a DELETE
+                transaction.set_rollback(True)
             
             # System is healthy if all operations succeed
             self.assertTrue(True)
@@ -394,13 +419,7 @@ class APIHealthSecurityTest(APITestCase):
                     content = response.content.decode('utf-8')
                     
                     # Check that sensitive info is not disclosed
-                    sensitive_terms = [
-                        'password', 'secret', 'key', 'token', 
-                        'database_url', 'private', 'confidential'
-                    ]
-                    
-                    for term in sensitive_terms:
-                        self.assertNotIn(term.lower(), content.lower())
+                    self.assertIsNone(SENSITIVE_TERMS_RE.search(content))
                     
                     # Test passes if no sensitive info found
                     self.assertTrue(True)
@@ -415,11 +434,11 @@ class APIHealthSecurityTest(APITestCase):
         
         for endpoint in endpoints_to_try:
             try:
-                # Make multiple rapid requests
-                responses = []
-                for _ in range(10):
-                    response = self.client.get(endpoint)
-                    responses.append(response.status_code)
+                # Make multiple concurrent requests, HEAD skips the body like real probes
+                with ThreadPoolExecutor(max_workers=10) as executor:
+                    responses = list(executor.map(
+                        lambda _: self.client.head(endpoint).status_code, range(10)
+                    ))
                 
                 # Health checks usually don't have strict rate limiting
                 # but should handle multiple requests gracefully
@@ -502,21 +521,92 @@ class APIHealthUtilityTest(TestCase):
             # Test passes as cache might not be required
             self.assertTrue(True)
 
-    def test_external_service_connectivity(self):
-        """Test external service connectivity (if any)"""
-        # This would test connections to external APIs, databases, etc.
-        # Since we don't know what external services are used, 
-        # this is a placeholder test
-        
+    def test_cpu_usage_does_not_block(self):
+        """CPU sampling should return immediately instead of sleeping"""
+        import time
+        from APIHealth.views import get_cpu_usage
+
+        start_time = time.monotonic()
+        first = get_cpu_usage()
+        second = get_cpu_usage()
+        elapsed = time.monotonic() - start_time
+
+        self.assertIsInstance(first, float)
+        self.assertEqual(first, second)
+        self.assertLess(elapsed, 0.1)
+
+    def test_circuit_breaker_opens_after_repeated_failures(self):
+        """A failing probe should stop being called once its breaker opens"""
+        from APIHealth import views
+
+        calls = []
+
+        def failing_probe():
+            calls.append(1)
+            raise ConnectionError("backend down")
+
+        views._BREAKERS["test"] = {"fails": 0, "open_until": 0.0}
+        probe = views.circuit_breaker("test")(failing_probe)
         try:
-            import requests
-            
-            # Test internet connectivity (basic check)
-            # Using a reliable service for testing
-            response = requests.get('https://httpbin.org/status/200', timeout=5)
-            self.assertEqual(response.status_code, 200)
-            
-        except Exception:
-            # External connectivity issues or requests not available
-            # Test passes as external services might not be required
-            self.assertTrue(True)
+            for _ in range(views.CIRCUIT_FAILURE_THRESHOLD + 2):
+                self.assertFalse(probe())
+
+            self.assertEqual(len(calls), views.CIRCUIT_FAILURE_THRESHOLD)
+        finally:
+            del views._BREAKERS["test"]
+
+    def test_health_report_reused_within_ttl(self):
+        """Back-to-back probes should share one report and not be cached downstream"""
+        from APIHealth import views
+
+        views._cached_health.update(data=None, at=0.0)
+        with patch.object(views, 'build_health_data', wraps=views.build_health_data) as build:
+            first = self.client.get('/health/', HTTP_ACCEPT='application/json')
+            second = self.client.get('/health/', HTTP_ACCEPT='application/json')
+
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['Cache-Control'], 'no-cache, max-age=0')
+
+    def test_health_check_unready_when_database_down(self):
+        """A dependency going offline should fail the readiness check"""
+        from APIHealth import views
+
+        views._cached_health.update(data=None, at=0.0)
+        try:
+            with patch.object(views, 'check_database', return_value=False):
+                response = self.client.get('/health/', HTTP_ACCEPT='application/json')
+        finally:
+            views._cached_health.update(data=None, at=0.0)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'unhealthy')
+        self.assertEqual(response.json()['database_status'], 'offline')
+
+    def test_health_check_content_negotiation(self):
+        """JSON should be served for compound Accept headers and plain text to probes"""
+        response = self.client.get('/health/', HTTP_ACCEPT='application/json, */*;q=0.5')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('database_status', response.json())
+
+        probe_response = self.client.get('/health/', HTTP_USER_AGENT='kube-probe/1.29')
+        self.assertEqual(probe_response.status_code, 200)
+        self.assertEqual(probe_response.content, b'ok')
+
+        html_response = self.client.get('/health/', HTTP_ACCEPT='text/html,application/xhtml+xml')
+        self.assertEqual(html_response.status_code, 200)
+        self.assertIn(b'API Health Status', html_response.content)
+
+    def test_health_check_probe_reports_unhealthy(self):
+        """Probes should get a bare 503 when a dependency is down"""
+        from APIHealth import views
+
+        views._cached_health.update(data=None, at=0.0)
+        try:
+            with patch.object(views, 'check_redis', return_value=False):
+                response = self.client.get('/health/', HTTP_USER_AGENT='kube-probe/1.29')
+        finally:
+            views._cached_health.update(data=None, at=0.0)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.content, b'unhealthy')
@@ -1,70 +1,227 @@
+import asyncio
 import psutil
 import socket
 import time
 import platform
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import wraps
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connections
 from django.db.utils import OperationalError
 from django.http import JsonResponse, HttpResponse
-from django.shortcuts import render
+from django.template.loader import get_template
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+from django_redis import get_redis_connection
 
 # Track app start time for uptime calculation
 APP_START_TIME = time.time()
 
+# Values that never change over the process lifetime
+HOSTNAME = socket.gethostname()
+PYTHON_VERSION = platform.python_version()
+APP_VERSION = getattr(settings, "APP_VERSION", "1.0.0")
+SITE_NAME = getattr(settings, "SITE_NAME", "Afrobuy Team Uganda")
+
+# Compiled once so browser hits skip the template loader chain
+HEALTH_TEMPLATE = get_template("health_check.html")
+
+# Prime psutil's CPU sampler so later non-blocking reads return a real delta
+psutil.cpu_percent(interval=None)
+
+# Minimum seconds between system samples; readings in between reuse the last value
+SYSTEM_SAMPLE_INTERVAL = 1.0
+_cpu_sample = {"value": 0.0, "at": 0.0}
+_memory_sample = {"value": 0.0, "at": 0.0}
+_uptime = [0, "0:00:00"]
+
+# Shared pool so the DB and Redis probes run side by side
+HEALTH_CHECK_TIMEOUT = 1.0
+_HEALTH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="health-check")
+
+# Circuit breaker: after repeated failures report offline without touching the backend
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_SECONDS = 30
+_BREAKERS = {
+    "db": {"fails": 0, "open_until": 0.0},
+    "redis": {"fails": 0, "open_until": 0.0},
+}
+
+# User agents of infrastructure probes that only need a status code
+PROBE_USER_AGENTS = ("kube-probe", "ELB-HealthChecker", "GoogleHC", "Prometheus")
+
+# Probe floods within this window share one report
+HEALTH_CACHE_TTL = 1.0
+_cached_health = {"data": None, "at": 0.0}
+
 
 def get_uptime():
     """Return human-readable uptime since app start."""
     uptime_seconds = int(time.time() - APP_START_TIME)
-    return str(timedelta(seconds=uptime_seconds))
+    # Uptime only changes once a second, reuse the formatted value until then
+    if uptime_seconds != _uptime[0]:
+        _uptime[:] = [uptime_seconds, str(timedelta(seconds=uptime_seconds))]
+    return _uptime[1]
+
+
+def get_cpu_usage():
+    """Return CPU usage percent without blocking the request."""
+    now = time.monotonic()
+    if now - _cpu_sample["at"] >= SYSTEM_SAMPLE_INTERVAL:
+        _cpu_sample["value"] = psutil.cpu_percent(interval=None)
+        _cpu_sample["at"] = now
+    return _cpu_sample["value"]
+
+
+def get_memory_usage():
+    """Return memory usage percent, re-reading /proc/meminfo at most once a second."""
+    now = time.monotonic()
+    if now - _memory_sample["at"] >= SYSTEM_SAMPLE_INTERVAL:
+        _memory_sample["value"] = psutil.virtual_memory().percent
+        _memory_sample["at"] = now
+    return _memory_sample["value"]
+
+
+def circuit_breaker(name):
+    """Short-circuit a probe to False while its breaker is open."""
+    def decorator(probe):
+        @wraps(probe)
+        def wrapper():
+            breaker = _BREAKERS[name]
+            now = time.monotonic()
+            if now < breaker["open_until"]:
+                return False
+
+            try:
+                ok = probe()
+            except Exception:
+                ok = False
+
+            if ok:
+                breaker["fails"] = 0
+                breaker["open_until"] = 0.0
+            else:
+                breaker["fails"] += 1
+                if breaker["fails"] >= CIRCUIT_FAILURE_THRESHOLD:
+                    breaker["open_until"] = now + CIRCUIT_RESET_SECONDS
+            return ok
+        return wrapper
+    return decorator
 
 
+@circuit_breaker("db")
 def check_database():
     """Return True if default DB is reachable."""
     try:
-        connections['default'].cursor()
-        return True
+        connection = connections['default']
+        # Probes run on pool threads, drop a stale connection before reusing it
+        connection.close_if_unusable_or_obsolete()
+        # Opening a cursor may not touch the server, so round-trip a heartbeat
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            return cursor.fetchone()[0] == 1
     except OperationalError:
         return False
 
 
+@circuit_breaker("redis")
 def check_redis():
     """Return True if Redis cache is reachable."""
     try:
-        from django.core.cache import cache
+        # Single PING on the pooled client, no write or pickling
+        return bool(get_redis_connection("default").ping())
+    except NotImplementedError:
+        # Non-Redis cache backend (e.g. local memory), fall back to a round trip
         cache.set("health_check_ping", "pong", timeout=5)
         return cache.get("health_check_ping") == "pong"
     except Exception:
         return False
 
 
+async def run_check(check):
+    """Run a blocking probe off the event loop, treating a slow or failing probe as offline."""
+    probe = sync_to_async(check, thread_sensitive=False, executor=_HEALTH_POOL)
+    try:
+        return await asyncio.wait_for(probe(), timeout=HEALTH_CHECK_TIMEOUT)
+    except Exception:
+        return False
+
+
 @csrf_exempt
-def health_check(request):
+@require_safe
+def alive(request):
     """
-    Professional health check endpoint.
-    - Returns JSON for API calls
-    - Renders HTML if browser access
+    Liveness endpoint for load balancers and container probes.
+    Touches no backing services so a flaky DB or Redis never restarts the process.
     """
+    return HttpResponse(b"ok", content_type="text/plain")
+
+
+async def build_health_data():
+    """Run the probes and assemble the health report."""
+    # Both probes run on separate threads and are awaited together
+    database_ok, redis_ok = await asyncio.gather(
+        run_check(check_database), run_check(check_redis)
+    )
+
     data = {
-        "status": "healthy",
+        # Readiness: any dependency down takes the instance out of rotation with a 503
+        "status": "healthy" if database_ok and redis_ok else "unhealthy",
         "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "version": getattr(settings, "APP_VERSION", "1.0.0"),
-        "site_name": getattr(settings, "SITE_NAME", "Afrobuy Team Uganda"),
-        "server": socket.gethostname(),
-        "python_version": platform.python_version(),
+        "version": APP_VERSION,
+        "site_name": SITE_NAME,
+        "server": HOSTNAME,
+        "python_version": PYTHON_VERSION,
         "uptime": get_uptime(),
-        "database_status": "online" if check_database() else "offline",
-        "redis_status": "online" if check_redis() else "offline",
-        "memory_usage": f"{psutil.virtual_memory().percent}%",
-        "cpu_usage": f"{psutil.cpu_percent(interval=0.5)}%",
+        "database_status": "online" if database_ok else "offline",
+        "redis_status": "online" if redis_ok else "offline",
+        "memory_usage": f"{get_memory_usage()}%",
+        "cpu_usage": f"{get_cpu_usage()}%",
     }
+    return data
+
+
+async def get_health_data():
+    """Return the health report, reusing it for HEALTH_CACHE_TTL seconds."""
+    now = time.monotonic()
+    if _cached_health["data"] is None or now - _cached_health["at"] >= HEALTH_CACHE_TTL:
+        _cached_health["data"] = await build_health_data()
+        _cached_health["at"] = now
+    return _cached_health["data"]
+
+
+@csrf_exempt
+async def health_check(request):
+    """
+    Professional health check endpoint (readiness).
+    - Returns plain text for infrastructure probes
+    - Renders HTML if the client asks for text/html
+    - Returns JSON otherwise
+    """
+    data = await get_health_data()
+    status_code = 200 if data["status"] == "healthy" else 503
 
+    # Infrastructure probes only read the status code, skip serialization
+    if request.META.get("HTTP_USER_AGENT", "").startswith(PROBE_USER_AGENTS):
+        response = HttpResponse(
+            b"ok" if status_code == 200 else b"unhealthy",
+            content_type="text/plain",
+            status=status_code,
+        )
     # If a monitoring tool wants JSON
-    if request.headers.get("Accept") == "application/json":
-        status_code = 200 if data["status"] == "healthy" else 503
-        return JsonResponse(data, status=status_code)
+    # Only browsers asking for HTML get the rendered page
+    elif "text/html" in request.headers.get("Accept", ""):
+        response = HttpResponse(
+            HEALTH_TEMPLATE.render(data, request), status=status_code
+        )
+    # Everything else, monitoring tools included, gets JSON
+    else:
+        response = JsonResponse(data, status=status_code)
 
-    # Otherwise render the HTML template
-    return render(request, "health_check.html", data)
+    # Intermediaries must not keep serving "healthy" after the app has died
+    response["Cache-Control"] = "no-cache, max-age=0"
+    return response
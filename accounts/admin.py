@@ -1,7 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 from .models import User, AdminProfile, VendorProfile, BuyerProfile, UserActivityLog, PasswordReset
+from .signals import invalidate_user_caches, sync_vendor_verification
+
+
+# Shared wallet formatter for the changelists, bound once
+format_ugx = "UGX {:,.2f}".format
+
+# Every (email_verified, phone_verified) combination rendered once
+VERIFICATION_BADGES = {
+    (email, phone): mark_safe(
+        f"Email: {'✅' if email else '❌'} | Phone: {'✅' if phone else '❌'}"
+    )
+    for email in (True, False)
+    for phone in (True, False)
+}
 
 
 @admin.register(User)
@@ -37,45 +51,54 @@ class UserAdmin(BaseUserAdmin):
     
     def wallet_display(self, obj):
         """Display wallet balance with currency formatting."""
-        return f"UGX {obj.wallet:,.2f}"
+        return format_ugx(obj.wallet)
     wallet_display.short_description = 'Wallet Balance'
+    wallet_display.admin_order_field = 'wallet'
     
     def verification_status(self, obj):
         """Display verification status with icons."""
-        email_icon = "✅" if obj.email_verified else "❌"
-        phone_icon = "✅" if obj.phone_verified else "❌"
-        return format_html(f"Email: {email_icon} | Phone: {phone_icon}")
+        return VERIFICATION_BADGES[(obj.email_verified, obj.phone_verified)]
     verification_status.short_description = 'Verified'
     
     actions = ['verify_email', 'verify_phone', 'unlock_accounts', 'activate_users', 'deactivate_users']
     
     def verify_email(self, request, queryset):
         """Mark selected users as email verified."""
+        user_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(email_verified=True)
+        invalidate_user_caches(user_ids)
         self.message_user(request, f'{updated} users marked as email verified.')
     verify_email.short_description = "Mark as email verified"
     
     def verify_phone(self, request, queryset):
         """Mark selected users as phone verified."""
+        user_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(phone_verified=True)
+        invalidate_user_caches(user_ids)
         self.message_user(request, f'{updated} users marked as phone verified.')
     verify_phone.short_description = "Mark as phone verified"
     
     def unlock_accounts(self, request, queryset):
         """Unlock selected user accounts."""
+        user_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(account_locked_until=None, login_attempts=0)
+        invalidate_user_caches(user_ids)
         self.message_user(request, f'{updated} accounts unlocked.')
     unlock_accounts.short_description = "Unlock accounts"
     
     def activate_users(self, request, queryset):
         """Activate selected users."""
+        user_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(status='active', is_active=True)
+        invalidate_user_caches(user_ids)
         self.message_user(request, f'{updated} users activated.')
     activate_users.short_description = "Activate users"
     
     def deactivate_users(self, request, queryset):
         """Deactivate selected users."""
+        user_ids = list(queryset.values_list('pk', flat=True))
         updated = queryset.update(status='inactive', is_active=False)
+        invalidate_user_caches(user_ids)
         self.message_user(request, f'{updated} users deactivated.')
     deactivate_users.short_description = "Deactivate users"
 
@@ -86,10 +109,12 @@ class AdminProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'department', 'get_email')
     list_filter = ('department',)
     search_fields = ('user__username', 'user__email', 'department')
+    list_select_related = ('user',)
     
     def get_email(self, obj):
         return obj.user.email
     get_email.short_description = 'Email'
+    get_email.admin_order_field = 'user__email'
 
 
 @admin.register(VendorProfile)
@@ -99,6 +124,7 @@ class VendorProfileAdmin(admin.ModelAdmin):
     list_filter = ('business_type', 'is_verified_vendor')
     search_fields = ('user__username', 'user__business_name', 'business_type', 'business_registration_number')
     readonly_fields = ('verification_documents',)
+    list_select_related = ('user',)
     
     fieldsets = (
         ('Basic Info', {
@@ -117,20 +143,27 @@ class VendorProfileAdmin(admin.ModelAdmin):
     )
     
     def get_wallet(self, obj):
-        return f"UGX {obj.user.wallet:,.2f}"
+        return format_ugx(obj.user.wallet)
     get_wallet.short_description = 'Wallet Balance'
+    get_wallet.admin_order_field = 'user__wallet'
     
     actions = ['verify_vendors', 'unverify_vendors']
     
     def verify_vendors(self, request, queryset):
         """Mark selected vendors as verified."""
+        # queryset.update() skips post_save, so mirror the flag onto the users here
+        user_ids = list(queryset.values_list('user_id', flat=True))
         updated = queryset.update(is_verified_vendor=True)
+        sync_vendor_verification(user_ids, True)
         self.message_user(request, f'{updated} vendors verified.')
     verify_vendors.short_description = "Verify vendors"
     
     def unverify_vendors(self, request, queryset):
         """Mark selected vendors as unverified."""
+        # queryset.update() skips post_save, so mirror the flag onto the users here
+        user_ids = list(queryset.values_list('user_id', flat=True))
         updated = queryset.update(is_verified_vendor=False)
+        sync_vendor_verification(user_ids, False)
         self.message_user(request, f'{updated} vendors unverified.')
     unverify_vendors.short_description = "Unverify vendors"
 
@@ -141,10 +174,12 @@ class BuyerProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'loyalty_tier', 'get_wallet', 'get_phone')
     list_filter = ('loyalty_tier',)
     search_fields = ('user__username', 'user__email', 'delivery_address')
+    list_select_related = ('user',)
     
     def get_wallet(self, obj):
-        return f"UGX {obj.user.wallet:,.2f}"
+        return format_ugx(obj.user.wallet)
     get_wallet.short_description = 'Wallet Balance'
+    get_wallet.admin_order_field = 'user__wallet'
     
     def get_phone(self, obj):
         phones = [obj.user.phone]
@@ -163,6 +198,9 @@ class UserActivityLogAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
+    list_select_related = ('user',)
+    # Skip the unfiltered COUNT(*) over the whole log table on every page
+    show_full_result_count = False
     
     fieldsets = (
         ('Activity Info', {
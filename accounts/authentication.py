@@ -1,4 +1,69 @@
+from django.core.cache import cache
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Per-process cache of validated tokens: key -> (expires_at, validated_token)
+TOKEN_CACHE_TTL = 30  # seconds
+TOKEN_CACHE_MAX_SIZE = 10000
+_token_cache = {}
+_token_cache_lock = threading.Lock()
+
+# Shared (Redis) cache of authenticated users so every worker skips the DB lookup
+USER_CACHE_TTL = 60  # seconds
+
+# Role profiles loaded with the user, so request.user.<profile> never costs a query
+AUTH_USER_RELATED = ("vendor_profile", "buyer_profile", "admin_profile")
+
+
+def _token_cache_key(raw_token):
+    """Return a compact 16-byte cache key for a raw JWT (str or bytes)."""
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    return hashlib.blake2b(raw_token, digest_size=16).digest()
+
+
+def _user_cache_key(user_id):
+    return f"user:{user_id}"
+
+
+def _revoked_token_key(key):
+    return f"revoked:{key.hex()}"
+
+
+def forget_token(token):
+    """Revoke a validated access token on every worker until it expires (e.g. on logout)."""
+    key = _token_cache_key(token.token)
+    ttl = token.get("exp", 0) - time.time()
+    if ttl > 0:
+        cache.set(_revoked_token_key(key), True, timeout=int(ttl) + 1)
+    with _token_cache_lock:
+        _token_cache.pop(key, None)
+
+
+def _cache_get_many(keys):
+    """Read the shared cache, treating an unreachable Redis as a miss on every key."""
+    try:
+        return cache.get_many(keys)
+    except Exception as e:
+        # The database can still authenticate, so an outage must not fail the request
+        logger.warning("Auth cache read failed, falling back to the database: %s", e)
+        return {}
+
+
+def invalidate_cached_user(user_id):
+    """Drop a user from the shared cache, so every worker reloads it on its next request."""
+    cache.delete(_user_cache_key(user_id))
+
 
 class CookieJWTAuthentication(JWTAuthentication):
     """
@@ -8,6 +73,13 @@ class CookieJWTAuthentication(JWTAuthentication):
     If the header is not present, it then tries to retrieve the JWT from a cookie named "access_token".
     If a valid token is found in the cookie, it validates the token and returns the associated user and token.
     If neither the header nor the cookie contains a valid token, authentication fails and None is returned.
+    A valid token whose user is inactive, deleted or revoked is rejected on either path.
+
+    Validated tokens are cached in-process for up to TOKEN_CACHE_TTL seconds (never beyond the
+    token's own expiry), so repeat requests skip the signature check. Revocation and user state live
+    only in the shared cache, so a logout or account change applies to every worker at once: each
+    request reads the token's revocation marker and its user (up to USER_CACHE_TTL seconds old) in
+    one round trip, unpickling its own user copy, before falling back to the database.
 
     Methods:
         authenticate(request):
@@ -19,12 +91,89 @@ class CookieJWTAuthentication(JWTAuthentication):
         header = self.get_header(request)
         if header is None:
             # If no header, attempt to retrieve it from the cookie
-            raw_token = request.COOKIES.get("access_token")
-            if raw_token is None:
+            raw_token = request.COOKIES.get("access_token") if request.COOKIES else None
+            if not raw_token:
                 return None
             try:
-                validated_token = self.get_validated_token(raw_token)
-            except Exception:
+                key, validated_token = self._validate_token(raw_token)
+            except InvalidToken:
+                # A bad cookie just means an anonymous request, but a valid one for a
+                # deactivated, deleted or revoked user still fails below
                 return None
+        else:
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            key, validated_token = self._validate_token(raw_token)
+
+        return self._authenticate_token(key, validated_token)
+
+    def _validate_token(self, raw_token):
+        """Validate a raw token, reusing a recent validation when possible."""
+        key = _token_cache_key(raw_token)
+        now = time.time()
+
+        cached = _token_cache.get(key)
+        if cached is not None and cached[0] > now:
+            validated_token = cached[1]
+        else:
+            validated_token = self.get_validated_token(raw_token)
+            expires_at = min(now + TOKEN_CACHE_TTL, validated_token.get("exp", now))
+            with _token_cache_lock:
+                if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+                    # Drop expired entries first, then the oldest if still full
+                    for stale_key in [k for k, v in _token_cache.items() if v[0] <= now]:
+                        del _token_cache[stale_key]
+                    if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+                        del _token_cache[next(iter(_token_cache))]
+                _token_cache[key] = (expires_at, validated_token)
+        return key, validated_token
+
+    def _authenticate_token(self, key, validated_token):
+        """Load a validated token's user, rejecting tokens revoked on any worker."""
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
             return self.get_user(validated_token), validated_token
-        return super().authenticate(request)
\ No newline at end of file
+
+        # One MGET tells whether the token was revoked on any worker and fetches its user
+        revoked_key, user_key = _revoked_token_key(key), _user_cache_key(user_id)
+        found = _cache_get_many([revoked_key, user_key])
+        if revoked_key in found:
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+        return self._check_user(validated_token, found.get(user_key)), validated_token
+
+    def get_user(self, validated_token):
+        """Load the token's user from the shared cache, falling back to the database."""
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        user_key = _user_cache_key(user_id)
+        return self._check_user(validated_token, _cache_get_many([user_key]).get(user_key))
+
+    def _check_user(self, validated_token, user):
+        """Load the user on a cache miss, then make sure the token may still act for it."""
+        # Every hit unpickles a fresh user, changes made by one request never reach another
+        if user is None:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+            user = self._load_user(user_id)
+            try:
+                cache.set(_user_cache_key(user_id), user, timeout=USER_CACHE_TTL)
+            except Exception as e:
+                logger.warning("Auth cache write failed: %s", e)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+    def _load_user(self, user_id):
+        """Fetch the user and its role profiles in one query."""
+        try:
+            return self.user_model.objects.select_related(*AUTH_USER_RELATED).get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete user activity logs older than the retention period, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 180),
+            help='Keep logs newer than this many days',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000, help='Rows deleted per statement'
+        )
+
+    def handle(self, *args, **options):
+        from accounts.models import UserActivityLog
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        total = 0
+
+        # Short deletes keep locks and WAL bursts small on the write-hot table
+        while True:
+            ids = list(
+                UserActivityLog.objects.filter(created_at__lt=cutoff)
+                .order_by()
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted, _ = UserActivityLog.objects.filter(id__in=ids).delete()
+            total += deleted
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {total} activity logs older than {options["days"]} days')
+        )
@@ -1,5 +1,4 @@
 from django.core.management.base import BaseCommand
-from django.template.loader import render_to_string
 from django.conf import settings
 
 class Command(BaseCommand):
@@ -1,33 +1,17 @@
 """
 Custom middleware for API endpoints.
 """
-from django.utils.deprecation import MiddlewareMixin
-from django.views.decorators.csrf import csrf_exempt
-from django.utils.decorators import method_decorator
+from django.middleware.csrf import CsrfViewMiddleware
 
 
-class CSRFExemptAPIMiddleware(MiddlewareMixin):
+class ApiCsrfMiddleware(CsrfViewMiddleware):
     """
-    Middleware to exempt API endpoints from CSRF protection.
-    Exempts all URLs starting with '/api/' from CSRF checks.
+    CsrfViewMiddleware that skips CSRF checks for URLs starting with '/api/'.
+    API clients authenticate with JWTs, so they never carry a CSRF token;
+    everything else (admin, browsable pages) keeps Django's normal protection.
     """
 
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        # Allow browsable API to work properly
-        if request.method == 'GET' and 'text/html' in request.META.get('HTTP_ACCEPT', ''):
-            pass # continuew processing
-
-        return self.get_response(request)
-
-    def process_view(self, request, view_func, view_args, view_kwargs):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
         if request.path.startswith('/api/'):
-            # For function-based views
-            setattr(view_func, 'csrf_exempt', True)
-            # For class-based views
-            if hasattr(view_func, 'view_class'):
-                view_class = view_func.view_class
-                method_decorator(csrf_exempt, name='dispatch')(view_class)
-        return None
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
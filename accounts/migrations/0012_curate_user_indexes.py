@@ -0,0 +1,62 @@
+# Generated by Django 5.2.5 on 2026-10-16 17:29
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0011_add_username_role_index"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="user",
+            name="idx_user_role",
+        ),
+        migrations.RemoveIndex(
+            model_name="user",
+            name="idx_user_username",
+        ),
+        migrations.RemoveIndex(
+            model_name="user",
+            name="idx_user_email",
+        ),
+        migrations.RemoveIndex(
+            model_name="user",
+            name="idx_user_phone",
+        ),
+        migrations.RemoveIndex(
+            model_name="user",
+            name="idx_user_status",
+        ),
+        migrations.RemoveIndex(
+            model_name="user",
+            name="idx_user_wallet",
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="role",
+            field=models.CharField(
+                choices=[("admin", "Admin"), ("vendor", "Vendor"), ("buyer", "Buyer")],
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="wallet",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=12
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                condition=models.Q(("role", "vendor"), ("status", "active")),
+                fields=["id"],
+                name="active_vendors_idx",
+            ),
+        ),
+    ]
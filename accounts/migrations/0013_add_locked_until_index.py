@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-16 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0012_curate_user_indexes"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                condition=models.Q(("account_locked_until__isnull", False)),
+                fields=["account_locked_until"],
+                name="idx_user_locked_until",
+            ),
+        ),
+    ]
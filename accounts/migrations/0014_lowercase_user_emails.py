@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+
+    # Addresses that differ only by case cannot all be lowercased under the UNIQUE constraint,
+    # and User.save() would fail on them later, so stop until they are merged by hand
+    collisions = list(
+        User.objects.exclude(email__isnull=True)
+        .values(lowered=Lower("email"))
+        .annotate(users=Count("id"))
+        .filter(users__gt=1)
+        .values_list("lowered", flat=True)
+    )
+    if collisions:
+        clashing = User.objects.annotate(lowered=Lower("email")).filter(lowered__in=collisions)
+        details = "\n".join(
+            f"  {lowered}: user ids {', '.join(str(pk) for pk in ids)}"
+            for lowered, ids in _group_ids(clashing.order_by("lowered", "id").values_list("lowered", "id"))
+        )
+        raise RuntimeError(
+            "Cannot lowercase user emails, these addresses are shared by several users "
+            "when case is ignored. Change or clear all but one email in each group, "
+            f"then rerun the migration:\n{details}"
+        )
+
+    User.objects.exclude(email__isnull=True).exclude(email=Lower("email")).update(email=Lower("email"))
+
+
+def _group_ids(rows):
+    groups = {}
+    for lowered, pk in rows:
+        groups.setdefault(lowered, []).append(pk)
+    return groups.items()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_add_locked_until_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+    ]
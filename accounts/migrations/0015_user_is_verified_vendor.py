@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-16 17:37
+
+from django.db import migrations, models
+
+
+def copy_vendor_verification(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    User.objects.filter(vendor_profile__is_verified_vendor=True).update(
+        is_verified_vendor=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0014_lowercase_user_emails"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="is_verified_vendor",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(copy_vendor_verification, migrations.RunPython.noop),
+    ]
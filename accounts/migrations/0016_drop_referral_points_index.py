@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-16 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0015_user_is_verified_vendor"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="referral_points",
+            field=models.IntegerField(default=0),
+        ),
+    ]
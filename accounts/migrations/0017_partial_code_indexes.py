@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-16 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0016_drop_referral_points_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="emailverification",
+            name="accounts_em_email_30f4ff_idx",
+        ),
+        migrations.AddIndex(
+            model_name="emailverification",
+            index=models.Index(
+                condition=models.Q(("verified", False)),
+                fields=["email", "verification_code"],
+                name="idx_ev_active",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="passwordreset",
+            index=models.Index(
+                condition=models.Q(("is_used", False)),
+                fields=["user", "email"],
+                name="idx_pr_unused",
+            ),
+        ),
+    ]
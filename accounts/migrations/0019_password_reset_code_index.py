@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-16 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0018_activity_log_created_at_default"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="passwordreset",
+            index=models.Index(
+                condition=models.Q(("is_used", False)),
+                fields=["email", "verification_code"],
+                name="idx_pr_unused_code",
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models, transaction
+from django.db.models import BooleanField, Case, ExpressionWrapper, F, Q, Value, When
+from django.db.models.functions import Coalesce, NullIf
 from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
 from django.utils import timezone
 from django.conf import settings
@@ -6,11 +8,24 @@ from django.conf import settings
 from decimal import Decimal
 from datetime import timedelta
 
-import random
-import string
 import secrets
 
 
+# Wallet amounts are stored with two decimal places
+_Q2 = Decimal("0.01")
+
+
+def _to_money(amount):
+    """Convert an amount to a 2dp Decimal, skipping the str() round trip where possible."""
+    if isinstance(amount, Decimal):
+        return amount.quantize(_Q2)
+    if isinstance(amount, int):
+        return Decimal(amount)
+    if isinstance(amount, float):
+        return Decimal(repr(amount)).quantize(_Q2)
+    return Decimal(str(amount)).quantize(_Q2)
+
+
 # User roles
 ROLES_DATA = (("admin", "Admin"), ("vendor", "Vendor"), ("buyer", "Buyer"))
 
@@ -34,6 +49,20 @@ class PasswordReset(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Unused codes are the only ones looked up or invalidated
+            models.Index(
+                fields=["user", "email"],
+                name="idx_pr_unused",
+                condition=models.Q(is_used=False),
+            ),
+            # Verify/confirm look unused codes up by email and code
+            models.Index(
+                fields=["email", "verification_code"],
+                name="idx_pr_unused_code",
+                condition=models.Q(is_used=False),
+            ),
+        ]
 
     @classmethod
     def create_fresh(cls, user, email, validity_minutes=15):
@@ -42,7 +71,7 @@ class PasswordReset(models.Model):
         cls.objects.filter(user=user, email=email, is_used=False).update(is_used=True)
 
         # Generate new code
-        code = "".join(random.choices(string.digits, k=6))
+        code = f"{secrets.randbelow(1_000_000):06d}"
         expires_at = timezone.now() + timezone.timedelta(minutes=validity_minutes)
 
         return cls.objects.create(
@@ -82,7 +111,12 @@ class EmailVerification(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=["email", "verification_code"]),
+            # Only pending codes are ever looked up by code
+            models.Index(
+                fields=["email", "verification_code"],
+                name="idx_ev_active",
+                condition=models.Q(verified=False),
+            ),
             models.Index(fields=["user", "verified"]),
         ]
 
@@ -104,22 +138,28 @@ class EmailVerification(models.Model):
     @staticmethod
     def generate_code() -> str:
         # Generating a six digit code
-        return f"{secrets.randbelow(999999):06}"
+        return f"{secrets.randbelow(1_000_000):06d}"
 
     @classmethod
     def create_fresh(cls, *, user, email, user_type, validity_minutes=10):
-        # create a fresh verification, expires any previous then creates a new one
-        with transaction.atomic():
-            cls.objects.filter(user=user, email=email, verified=False).update(
-                expires_at=timezone.now() - timedelta(seconds=1)
-            )
-            return cls.objects.create(
-                user=user,
-                email=email,
-                user_type=user_type,
-                verification_code=cls.generate_code(),
-                expires_at=timezone.now() + timedelta(minutes=validity_minutes),
-            )
+        """
+        Issue a new code for user + email, reusing the pending row if there is one.
+
+        This is not a single UPSERT: a partial unique constraint cannot be an ON CONFLICT target, so
+        update_or_create runs SELECT ... FOR UPDATE, then UPDATE or INSERT. When two first-time calls
+        both INSERT, the constraint rejects the second and update_or_create updates the winner's row.
+        """
+        verification, _ = cls.objects.update_or_create(
+            user=user,
+            email=email,
+            verified=False,
+            defaults={
+                "user_type": user_type,
+                "verification_code": cls.generate_code(),
+                "expires_at": timezone.now() + timedelta(minutes=validity_minutes),
+            },
+        )
+        return verification
 
     def mark_verified(self):
         # Mark email as verified and update the user's email status
@@ -127,21 +167,31 @@ class EmailVerification(models.Model):
         if self.verified:
             return
 
+        from .authentication import invalidate_cached_user
+        from .security import invalidate_user_cache
+
         self.verified = True
         self.verified_at = timezone.now()
-        self.save(update_fields=["verified", "verified_at"])
 
-        # Flip user flag
-        self.user.email_verified = True
-
-        # persist the verified address on the user if that's your policy:
-        if not self.user.email:
-            self.user.email = self.email
-        self.user.save(update_fields=["email_verified", "email"])
+        # Two UPDATEs and no SELECT of the user row
+        with transaction.atomic(savepoint=False):
+            EmailVerification.objects.filter(pk=self.pk).update(
+                verified=True, verified_at=self.verified_at
+            )
+            # Flip the user flag and keep the verified address if none is on file (NULL or blank),
+            # lowercased the way User.save() would store it
+            User.objects.filter(pk=self.user_id).update(
+                email_verified=True,
+                email=Coalesce(NullIf("email", Value("")), Value(self.email.lower())),
+            )
+        invalidate_cached_user(self.user_id)
+        invalidate_user_cache(self.user_id)
 
-        # Update the user model
-        # self.user.email_verified = True
-        # self.user.save(update_fields=['email_verified'])
+        # Keep an already-loaded user in step without fetching it
+        if EmailVerification.user.is_cached(self):
+            self.user.email_verified = True
+            if not self.user.email:
+                self.user.email = self.email.lower()
 
 
 # User management model
@@ -152,18 +202,40 @@ class UserManager(DjangoUserManager):
     - admins(): Returns a queryset of users with the 'admin' role.
     - vendors(): Returns a queryset of users with the 'vendor' role.
     - buyers(): Returns a queryset of users with the 'buyer' role.
+    - with_locked_flag(): Annotates each user with is_locked, computed in SQL.
     These methods help to easily filter users based on their assigned role,
     improving code readability and maintainability when working with different user types.
+
+    By default the role helpers only load ROLE_LIST_FIELDS (identity plus the flags permission
+    checks read); any other field read later costs an extra query per instance, so pass
+    full=True when callers need the whole row. Connections are reused via CONN_MAX_AGE.
     """
 
-    def admins(self):
-        return self.get_queryset().filter(role="admin")
+    ROLE_LIST_FIELDS = (
+        "id", "username", "email", "role", "status", "email_verified", "is_verified_vendor"
+    )
+
+    def _by_role(self, role, full):
+        queryset = self.filter(role=role)
+        return queryset if full else queryset.only(*self.ROLE_LIST_FIELDS)
+
+    def admins(self, full=False):
+        return self._by_role("admin", full)
+
+    def vendors(self, full=False):
+        return self._by_role("vendor", full)
 
-    def vendors(self):
-        return self.get_queryset().filter(role="vendor")
+    def buyers(self, full=False):
+        return self._by_role("buyer", full)
 
-    def buyers(self):
-        return self.get_queryset().filter(role="buyer")
+    def with_locked_flag(self):
+        # Let the database evaluate is_account_locked() for whole querysets
+        return self.annotate(
+            is_locked=ExpressionWrapper(
+                Q(account_locked_until__gt=timezone.now()),
+                output_field=BooleanField(),
+            )
+        )
 
 
 # The user model
@@ -186,6 +258,7 @@ class User(AbstractUser):
         # Security and verification fields
         status (CharField): Account status (active, inactive, suspended, pending).
         email_verified (BooleanField): Whether email has been verified.
+        is_verified_vendor (BooleanField): Copy of the vendor profile's verification flag.
         phone_verified (BooleanField): Whether phone has been verified.
         login_attempts (IntegerField): Number of failed login attempts.
         account_locked_until (DateTimeField): Account lockout expiration.
@@ -198,6 +271,8 @@ class User(AbstractUser):
         is_account_locked: Checks if account is currently locked.
         lock_account: Locks the account for specified duration.
         unlock_account: Unlocks the account.
+        register_failed_login: Counts a failed login, locking the account once the limit is hit.
+        reset_login_attempts: Clears the failed login count after a successful login.
         add_wallet_balance: Safely adds to wallet balance.
         deduct_wallet_balance: Safely deducts from wallet balance (with validation).
     """
@@ -210,7 +285,7 @@ class User(AbstractUser):
     last_name = models.CharField(max_length=150, blank=True, null=True)
 
     email = models.EmailField(unique=True, blank=True, null=True)
-    role = models.CharField(max_length=20, choices=ROLES_DATA, db_index=True)
+    role = models.CharField(max_length=20, choices=ROLES_DATA)
 
     # Enhanced profile fields
     profile_image = models.ImageField(upload_to="profiles/", null=True, blank=True)
@@ -220,10 +295,10 @@ class User(AbstractUser):
 
     # Financial Fields
     wallet = models.DecimalField(
-        max_digits=12, decimal_places=2, default=Decimal("0.00"), db_index=True
+        max_digits=12, decimal_places=2, default=Decimal("0.00")
     )
 
-    referral_points = models.IntegerField(default=0, db_index=True)
+    referral_points = models.IntegerField(default=0)
 
     # Security and verification fields
     status = models.CharField(
@@ -232,6 +307,8 @@ class User(AbstractUser):
     email_verified = models.BooleanField(default=False)
     phone_verified = models.BooleanField(default=False)
     login_attempts = models.IntegerField(default=0)
+    # Mirrors vendor_profile.is_verified_vendor (kept in sync by a signal) so permission checks skip the join
+    is_verified_vendor = models.BooleanField(default=False, db_index=True)
     account_locked_until = models.DateTimeField(null=True, blank=True)
 
     # Date and time objects
@@ -243,19 +320,16 @@ class User(AbstractUser):
     # creating indexes for faster lookups
     class Meta:
         indexes = [
-            models.Index(name="idx_user_role", fields=["role"]),  # Fast lookups by role
-            models.Index(name="idx_user_username", fields=["username"]),
-            models.Index(name="idx_user_email", fields=["email"]),  # Fast email lookups
-            models.Index(name="idx_user_phone", fields=["phone"]),  # Fast phone lookups
-            models.Index(
-                name="idx_user_status", fields=["status"]
-            ),  # Fast status filtering
-            models.Index(
-                name="idx_user_wallet", fields=["wallet"]
-            ),  # Fast wallet queries
+            # username and email are UNIQUE, phone and status carry db_index,
+            # so only composite and partial indexes are declared here
             models.Index(
                 name="idx_user_role_status", fields=["role", "status"]
-            ),  # Composite index for common filters
+            ),  # Composite index for common filters, also serves role-only lookups
+            models.Index(
+                name="active_vendors_idx",
+                fields=["id"],
+                condition=models.Q(role="vendor", status="active"),
+            ),  # Partial index for listing active vendors
             models.Index(
                 name="idx_user_username_role", fields=["username", "role"]
             ),  # Fast vendor username lookups
@@ -263,15 +337,24 @@ class User(AbstractUser):
                 name="idx_user_verification",
                 fields=["email_verified", "phone_verified"],
             ),  # Verification status queries
+            models.Index(
+                name="idx_user_locked_until",
+                fields=["account_locked_until"],
+                condition=models.Q(account_locked_until__isnull=False),
+            ),  # Partial index for locked account lookups
         ]
 
     def __str__(self):
-        return f"{self.first_name} {self.last_name} ({self.role})"
+        # save() blanks first/last name whenever full_name is set, so prefer full_name
+        return self.full_name or self.username or self.email or f"user#{self.pk}"
 
     def save(self, *args, **kwargs):
         # Clear first name and last name if full_name is provided
         if self.email == "":
             self.email = None
+        elif self.email:
+            # Stored lowercase so case-insensitive lookups can use the UNIQUE index with a plain =
+            self.email = self.email.lower()
 
         if self.full_name:
             self.first_name = ""
@@ -292,17 +375,63 @@ class User(AbstractUser):
         self.save(update_fields=["account_locked_until"])
 
     def unlock_account(self):
-        self.account_locked_until = None
+        User.objects.filter(pk=self.pk).update(
+            account_locked_until=None, login_attempts=0
+        )
+        self._refresh_fields("account_locked_until", "login_attempts")
+
+    def register_failed_login(self, max_attempts=5, duration_minutes=30):
+        # Count the failure and lock on the last allowed attempt in one UPDATE
+        locked_until = timezone.now() + timezone.timedelta(minutes=duration_minutes)
+        User.objects.filter(pk=self.pk).update(
+            login_attempts=F("login_attempts") + 1,
+            account_locked_until=Case(
+                When(login_attempts__gte=max_attempts - 1, then=Value(locked_until)),
+                default=F("account_locked_until"),
+            ),
+        )
+        self._refresh_fields("account_locked_until", "login_attempts")
+        return self.is_account_locked()
+
+    def reset_login_attempts(self):
+        # Plain UPDATE without a re-read, a login that never failed skips the write entirely
+        if not self.login_attempts:
+            return
+        from .authentication import invalidate_cached_user
+
+        User.objects.filter(pk=self.pk).update(login_attempts=0)
         self.login_attempts = 0
-        self.save(update_fields=["account_locked_until", "login_attempts"])
+        invalidate_cached_user(self.pk)
+
+    def _refresh_fields(self, *fields):
+        # The UPDATE bypasses save(), so refresh this instance and the auth cache by hand
+        from .authentication import invalidate_cached_user
+
+        self.refresh_from_db(fields=fields)
+        invalidate_cached_user(self.pk)
 
     def add_wallet_balance(self, amount):
-        # safely add to wallet balance
-        if amount > 0:
-            self.wallet += Decimal(str(amount))
-            self.save(update_fields=["wallet"])
-            return True
-        return False
+        # safely add to wallet balance in a single UPDATE, no read-modify-write race
+        if amount <= 0:
+            return False
+        updated = User.objects.filter(pk=self.pk).update(
+            wallet=F("wallet") + _to_money(amount)
+        )
+        if updated:
+            self._refresh_fields("wallet")
+        return bool(updated)
+
+    def deduct_wallet_balance(self, amount):
+        # check the balance and deduct it in the same UPDATE
+        if amount <= 0:
+            return False
+        amount = _to_money(amount)
+        updated = User.objects.filter(pk=self.pk, wallet__gte=amount).update(
+            wallet=F("wallet") - amount
+        )
+        if updated:
+            self._refresh_fields("wallet")
+        return bool(updated)
 
 
 # Creating enhanced profiles for the specific roles
@@ -418,7 +547,8 @@ class UserActivityLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True, null=True)
     metadata = models.JSONField(default=dict, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set from the event time, since buffered rows are inserted after the fact
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         indexes = [
@@ -473,4 +603,4 @@ class ArchiveUser(models.Model):
         verbose_name_plural = "Archived Users"
 
     def __str__(self):
-        return f"Archived: {self.full_name} ({self.email})"
+        return self.full_name or self.email
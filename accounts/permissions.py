@@ -3,10 +3,74 @@ Custom permissions for role-based access control and security.
 """
 from rest_framework import permissions
 from django.core.cache import cache
+from django_redis import get_redis_connection
+import hashlib
 import logging
+import secrets
+import time
 
 logger = logging.getLogger('accounts.security')
 
+_UNSET = object()
+
+# What _peek_role returns when the body has no 'role' key at all
+_NO_ROLE = object()
+
+_ADMIN_VENDOR = frozenset({'admin', 'vendor'})
+
+# Methods whose body never sets a role, so role checks skip parsing it
+_ROLELESS_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'DELETE'})
+
+# Sliding window: each hit is a timestamped sorted-set member, old ones are trimmed
+RATE_LIMIT_WINDOW = 60  # seconds
+
+# Requests allowed per window, by throttle scope
+RATE_LIMITS = {
+    'login': 5,  # 5 per minute
+    'register': 3,  # 3 per minute
+    'password_reset': 3,  # 3 per minute
+}
+RATE_LIMIT_DEFAULT = 10
+
+
+def _hit_rate_limit(key, limit):
+    """Count a request against key if it fits under limit for the last RATE_LIMIT_WINDOW seconds, return whether it did."""
+    try:
+        conn = get_redis_connection("default")
+    except NotImplementedError:
+        # Non-Redis cache backend (e.g. local memory), fixed window instead
+        cache.add(key, 0, RATE_LIMIT_WINDOW)
+        if cache.incr(key) > limit:
+            cache.decr(key)
+            return False
+        return True
+
+    # The raw connection skips KEY_PREFIX, apply it as the cache calls above do
+    key = cache.make_key(key)
+    now = time.time()
+    member = f"{now}:{secrets.token_hex(4)}"
+    pipe = conn.pipeline()  # MULTI/EXEC, one round trip
+    pipe.zremrangebyscore(key, 0, now - RATE_LIMIT_WINDOW)
+    pipe.zadd(key, {member: now})
+    pipe.zcard(key)
+    pipe.expire(key, RATE_LIMIT_WINDOW)
+    _, _, count, _ = pipe.execute()
+    if count > limit:
+        # Rejected requests leave the window, so a client retrying in a loop gets back in as old hits age out
+        conn.zrem(key, member)
+        return False
+    return True
+
+
+def _peek_role(request):
+    """Return the 'role' sent in the request body (_NO_ROLE if absent), parsing the body at most once."""
+    role = getattr(request, '_role_peek', _UNSET)
+    if role is _UNSET:
+        data = request.data
+        role = data.get('role', _NO_ROLE) if hasattr(data, 'get') else _NO_ROLE
+        request._role_peek = role
+    return role
+
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
@@ -60,7 +124,7 @@ class IsAdminOrVendor(permissions.BasePermission):
         return bool(
             request.user and 
             request.user.is_authenticated and 
-            request.user.role in ['admin', 'vendor']
+            request.user.role in _ADMIN_VENDOR
         )
 
 
@@ -70,22 +134,13 @@ class IsVerifiedVendor(permissions.BasePermission):
     """
     
     def has_permission(self, request, view):
-        if not (request.user and request.user.is_authenticated and request.user.role == 'vendor'):
-            return False
-        
-        # Cache the verification status
-        cache_key = f"vendor_verified_{request.user.id}"
-        is_verified = cache.get(cache_key)
-        
-        if is_verified is None:
-            try:
-                is_verified = request.user.vendor_profile.is_verified_vendor
-                cache.set(cache_key, is_verified, 300)  # Cache for 5 minutes
-            except:
-                is_verified = False
-                cache.set(cache_key, is_verified, 60)  # Cache shorter for error cases
-        
-        return is_verified
+        # is_verified_vendor mirrors vendor_profile.is_verified_vendor, no join or cache needed
+        return bool(
+            request.user and
+            request.user.is_authenticated and
+            request.user.role == 'vendor' and
+            request.user.is_verified_vendor
+        )
 
 
 class CanManageUsers(permissions.BasePermission):
@@ -114,7 +169,7 @@ class CanCreateVendor(permissions.BasePermission):
     """
     
     def has_permission(self, request, view):
-        if request.method == 'POST' and request.data.get('role') == 'vendor':
+        if request.method == 'POST' and _peek_role(request) == 'vendor':
             return bool(
                 request.user and 
                 request.user.is_authenticated and 
@@ -159,7 +214,7 @@ class PreventRoleEscalation(permissions.BasePermission):
     
     def has_permission(self, request, view):
         # Allow if not trying to modify role
-        if 'role' not in request.data:
+        if request.method in _ROLELESS_METHODS or _peek_role(request) is _NO_ROLE:
             return True
         
         # Only admins can modify roles
@@ -176,7 +231,8 @@ class RateLimitPermission(permissions.BasePermission):
     """
     
     def has_permission(self, request, view):
-        if not hasattr(view, 'throttle_scope'):
+        throttle_scope = getattr(view, 'throttle_scope', None)
+        if throttle_scope is None:
             return True
         
         # Get client IP
@@ -186,22 +242,14 @@ class RateLimitPermission(permissions.BasePermission):
         else:
             ip = request.META.get('REMOTE_ADDR')
         
-        cache_key = f"rate_limit_{view.throttle_scope}_{ip}"
-        current_requests = cache.get(cache_key, 0)
-        
-        # Define rate limits
-        limits = {
-            'login': 5,  # 5 per minute
-            'register': 3,  # 3 per minute
-            'password_reset': 3,  # 3 per minute
-        }
+        # Short fixed-length key however long the address (IPv6, forwarded junk)
+        ip_digest = hashlib.blake2b((ip or '').encode(), digest_size=8).hexdigest()
+        cache_key = f"rl:{throttle_scope}:{ip_digest}"
         
-        limit = limits.get(view.throttle_scope, 10)
+        limit = RATE_LIMITS.get(throttle_scope, RATE_LIMIT_DEFAULT)
         
-        if current_requests >= limit:
-            logger.warning(f"Rate limit exceeded for {ip} on {view.throttle_scope}")
+        if not _hit_rate_limit(cache_key, limit):
+            logger.warning(f"Rate limit exceeded for {ip} on {throttle_scope}")
             return False
         
-        # Increment counter
-        cache.set(cache_key, current_requests + 1, 60)  # 1 minute window
         return True
@@ -4,14 +4,58 @@ Security utilities and helper functions for authentication and authorization.
 from django.core.cache import cache
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django_redis import get_redis_connection
 from .models import UserActivityLog
+from functools import lru_cache
+from types import MappingProxyType
+import base64
+import bcrypt
+import hmac
+import json
 import logging
 import hashlib
 import secrets
+import threading
+import time
 
 User = get_user_model()
 logger = logging.getLogger('accounts.security')
 
+# Permissions are refreshed on every relevant user write, the TTL only bounds missed bulk updates
+PERMISSIONS_CACHE_TTL = 3600  # 1 hour
+
+# Per-process copy of permissions so hot users skip Redis: user_id -> (expires_at, permissions)
+PERMISSIONS_LOCAL_TTL = 5  # seconds
+PERMISSIONS_LOCAL_MAX_SIZE = 10000
+_local_permissions = {}
+_local_permissions_lock = threading.Lock()
+# Striped by user id so concurrent misses for one user rebuild once, without a lock per user
+_permissions_build_locks = tuple(threading.Lock() for _ in range(64))
+
+# User fields cache_user_permissions reads; saves touching none of them keep the cached entries
+PERMISSION_FIELDS = frozenset({'role', 'status', 'is_active', 'email_verified', 'phone_verified'})
+
+# bcrypt work factor for secure_hash, about the wall-clock cost of the old 100k PBKDF2 rounds
+SECURE_HASH_ROUNDS = 10
+
+# Suspicious-activity audit rows kept per user per window, later hits are only counted
+SUSPICIOUS_LOG_LIMIT = 5
+SUSPICIOUS_LOG_WINDOW = 60  # seconds
+
+# Redis list that buffers activity log rows until flush_activity_logs bulk-inserts them, stored under
+# cache.make_key(ACTIVITY_LOG_QUEUE) like every other cache key. The hash tag keeps its processing, dead-letter and lock keys on the same Redis Cluster slot
+ACTIVITY_LOG_QUEUE = '{audit:log}'
+
+
+def _queue_activity(event):
+    """Push an activity log row onto the Redis buffer, returning False if it could not be queued."""
+    try:
+        get_redis_connection("default").rpush(cache.make_key(ACTIVITY_LOG_QUEUE), json.dumps(event))
+    except Exception:
+        # Non-Redis cache backend or Redis unreachable, the caller writes the row itself
+        return False
+    return True
+
 
 def log_user_activity(user, action, description, request=None, metadata=None):
     """
@@ -31,14 +75,18 @@ def log_user_activity(user, action, description, request=None, metadata=None):
             
             user_agent = request.META.get('HTTP_USER_AGENT', '')
         
-        UserActivityLog.objects.create(
-            user=user,
-            action=action,
-            description=description,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            metadata=metadata or {}
-        )
+        event = {
+            'user_id': user.pk,
+            'action': action,
+            'description': description,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'metadata': metadata or {},
+            'created_at': timezone.now().isoformat(),
+        }
+        if not _queue_activity(event):
+            event['created_at'] = timezone.now()
+            UserActivityLog.objects.create(**event)
         
         # Also log to file
         logger.info(f"Activity: {user.username} - {action} - {description} - IP: {ip_address}")
@@ -47,50 +95,74 @@ def log_user_activity(user, action, description, request=None, metadata=None):
         logger.error(f"Failed to log user activity: {e}")
 
 
+def _user_version_key(user_id):
+    # The {user_id} hash tag keeps a user's version and entries on one Redis Cluster slot
+    return f"uv:{{{user_id}}}"
+
+
+def _new_user_version():
+    # Time-based, so a version key lost to eviction never revives entries cached under an older one
+    return time.time_ns()
+
+
 def generate_cache_key(prefix, user_id, suffix=''):
     """
     Generate a standardized cache key.
+
+    Keys embed the user's cache version, so invalidate_user_cache retires all of them at once.
     """
-    key = f"afrobuy:{prefix}:{user_id}"
+    version = cache.get_or_set(_user_version_key(user_id), _new_user_version, None)
+    key = f"afrobuy:{prefix}:{{{user_id}}}:v{version}"
     if suffix:
         key += f":{suffix}"
     return key
 
 
-def cache_user_permissions(user):
-    """
-    Cache user permissions for faster access.
-    """
-    cache_key = generate_cache_key('permissions', user.id)
-    
-    permissions = {
-        'role': user.role,
-        'is_admin': user.role == 'admin',
-        'is_vendor': user.role == 'vendor',
-        'is_buyer': user.role == 'buyer',
-        'is_verified': user.email_verified and user.phone_verified,
-        'is_active': user.is_active and user.status == 'active',
-        'can_make_purchases': user.role in ['buyer', 'admin'] and user.status == 'active',
-        'can_sell': user.role in ['vendor', 'admin'] and user.status == 'active'
-    }
+@lru_cache(maxsize=16)
+def _role_permissions(role, status):
+    """Permission flags that depend only on role and status, built once per combination."""
+    active = status == 'active'
+    return MappingProxyType({
+        'role': role,
+        'is_admin': role == 'admin',
+        'is_vendor': role == 'vendor',
+        'is_buyer': role == 'buyer',
+        'can_make_purchases': role in ('buyer', 'admin') and active,
+        'can_sell': role in ('vendor', 'admin') and active,
+    })
+
+
+def _build_permissions(user):
+    """Compute the permission flags for a user from its fields and vendor profile."""
+    permissions = dict(_role_permissions(user.role, user.status))
+    permissions['is_verified'] = user.email_verified and user.phone_verified
+    permissions['is_active'] = user.is_active and user.status == 'active'
     
     # Add vendor-specific permissions
     if user.role == 'vendor':
-        try:
-            vendor_profile = user.vendor_profile
+        # A missing profile raises RelatedObjectDoesNotExist (an AttributeError), getattr absorbs it
+        vendor_profile = getattr(user, 'vendor_profile', None)
+        if vendor_profile is not None:
             permissions.update({
                 'is_verified_vendor': vendor_profile.is_verified_vendor,
                 'can_receive_payments': vendor_profile.is_verified_vendor,
                 'commission_rate': float(vendor_profile.commission_rate)
             })
-        except:
+        else:
             permissions.update({
                 'is_verified_vendor': False,
                 'can_receive_payments': False,
                 'commission_rate': 0.0
             })
-    
-    cache.set(cache_key, permissions, 300)  # Cache for 5 minutes
+    return permissions
+
+
+def cache_user_permissions(user):
+    """
+    Cache user permissions for faster access.
+    """
+    permissions = _build_permissions(user)
+    cache.set(generate_cache_key('permissions', user.id), permissions, PERMISSIONS_CACHE_TTL)
     return permissions
 
 
@@ -98,12 +170,28 @@ def get_cached_user_permissions(user):
     """
     Get user permissions from cache or generate them.
     """
+    now = time.monotonic()
+    local = _local_permissions.get(user.id)
+    if local is not None and local[0] > now:
+        # Copy so one caller's changes never leak into another's
+        return dict(local[1])
+
+    # Two GETs on a Redis miss (version, then entry); the process copy above absorbs hot users
     cache_key = generate_cache_key('permissions', user.id)
     permissions = cache.get(cache_key)
-    
+
     if permissions is None:
-        permissions = cache_user_permissions(user)
-    
+        # One rebuild per user per process on a cold start, the others wait and read its entry.
+        # get_or_set adds rather than sets, so a concurrent write-through is never overwritten
+        with _permissions_build_locks[user.id % len(_permissions_build_locks)]:
+            permissions = cache.get_or_set(
+                cache_key, lambda: _build_permissions(user), PERMISSIONS_CACHE_TTL
+            )
+
+    with _local_permissions_lock:
+        if len(_local_permissions) >= PERMISSIONS_LOCAL_MAX_SIZE:
+            del _local_permissions[next(iter(_local_permissions))]
+        _local_permissions[user.id] = (now + PERMISSIONS_LOCAL_TTL, dict(permissions))
     return permissions
 
 
@@ -111,27 +199,60 @@ def invalidate_user_cache(user_id):
     """
     Invalidate all cached data for a user.
     """
-    cache_keys = [
-        generate_cache_key('permissions', user_id),
-        generate_cache_key('profile', user_id),
-        f"vendor_verified_{user_id}",
-        f"user_profile_{user_id}"
-    ]
-    
-    cache.delete_many(cache_keys)
+    with _local_permissions_lock:
+        _local_permissions.pop(user_id, None)
+    # Bumping the version orphans every key built by generate_cache_key, they expire on their TTL
+    try:
+        cache.incr(_user_version_key(user_id))
+    except ValueError:
+        cache.set(_user_version_key(user_id), _new_user_version(), None)
     logger.info(f"Cache invalidated for user {user_id}")
 
 
+def _incr_with_ttl(key, window):
+    """Atomically bump a counter, starting its TTL on the first hit, and return the new value."""
+    try:
+        conn = get_redis_connection("default")
+    except NotImplementedError:
+        # Non-Redis cache backend (e.g. local memory)
+        cache.add(key, 0, window)
+        return cache.incr(key)
+
+    # The raw connection skips KEY_PREFIX, apply it as the cache calls above do
+    key = cache.make_key(key)
+    pipe = conn.pipeline()  # MULTI/EXEC, one round trip
+    pipe.incr(key)
+    pipe.expire(key, window, nx=True)  # Redis 7+, later hits keep the original window
+    count, _ = pipe.execute()
+    return count
+
+
+def _count_distinct(key, member, window):
+    """Add member to a distinct-count set held server-side and return the approximate set size."""
+    try:
+        conn = get_redis_connection("default")
+    except NotImplementedError:
+        # Non-Redis cache backend (e.g. local memory), keep an exact set in the cache
+        members = cache.get(key, set())
+        members.add(member)
+        cache.set(key, members, window)
+        return len(members)
+
+    # HyperLogLog stays under 12 KB per key however many members it sees
+    key = cache.make_key(key)
+    pipe = conn.pipeline()
+    pipe.pfadd(key, member)
+    pipe.pfcount(key)
+    pipe.expire(key, window, nx=True)
+    _, count, _ = pipe.execute()
+    return count
+
+
 def check_rate_limit(key, limit, window=60):
     """
     Check if a rate limit has been exceeded.
     """
-    current = cache.get(key, 0)
-    if current >= limit:
-        return False
-    
-    cache.set(key, current + 1, window)
-    return True
+    return _incr_with_ttl(key, window) <= limit
 
 
 def is_suspicious_activity(user, request):
@@ -149,29 +270,23 @@ def is_suspicious_activity(user, request):
     
     # Check for multiple accounts from same IP
     ip_cache_key = f"ip_users:{ip}"
-    ip_users = cache.get(ip_cache_key, set())
-    ip_users.add(user.username)
-    
-    if len(ip_users) > 5:  # More than 5 different users from same IP
+    if _count_distinct(ip_cache_key, user.username, 3600) > 5:  # More than 5 different users from same IP
         suspicious_indicators.append('multiple_users_same_ip')
     
-    cache.set(ip_cache_key, ip_users, 3600)  # Cache for 1 hour
-    
     # Check for rapid successive logins
     login_cache_key = f"rapid_login:{user.id}"
-    login_count = cache.get(login_cache_key, 0)
-    
-    if login_count > 3:  # More than 3 logins in 5 minutes
+    if _incr_with_ttl(login_cache_key, 300) > 4:  # More than 3 earlier logins in 5 minutes
         suspicious_indicators.append('rapid_logins')
     
-    cache.set(login_cache_key, login_count + 1, 300)  # 5 minutes
-    
     # Check user agent
     user_agent = request.META.get('HTTP_USER_AGENT', '')
     if not user_agent or len(user_agent) < 10:
         suspicious_indicators.append('suspicious_user_agent')
     
-    if suspicious_indicators:
+    # Cap audit rows per user so an attack cannot turn detection into a write flood
+    if suspicious_indicators and check_rate_limit(
+        f"suspicious_log:{user.id}", SUSPICIOUS_LOG_LIMIT, SUSPICIOUS_LOG_WINDOW
+    ):
         logger.warning(f"Suspicious activity detected for {user.username}: {suspicious_indicators}")
         log_user_activity(
             user, 
@@ -184,23 +299,40 @@ def is_suspicious_activity(user, request):
     return len(suspicious_indicators) > 0
 
 
+def _bcrypt_input(data):
+    # bcrypt reads at most 72 bytes, so pre-hash to keep long input from being truncated
+    return base64.b64encode(hashlib.sha256(data.encode()).digest())
+
+
 def secure_hash(data):
     """
     Generate a secure hash for sensitive data.
     """
-    salt = secrets.token_hex(16)
-    return hashlib.pbkdf2_hmac('sha256', data.encode(), salt.encode(), 100000).hex() + ':' + salt
+    return bcrypt.hashpw(_bcrypt_input(data), bcrypt.gensalt(SECURE_HASH_ROUNDS)).decode()
 
 
 def verify_secure_hash(data, hashed):
     """
-    Verify a secure hash.
+    Verify a secure hash, bcrypt or the older PBKDF2 "hex:salt" form.
     """
     try:
+        if hashed.startswith('$2'):
+            return bcrypt.checkpw(_bcrypt_input(data), hashed.encode())
         hash_part, salt = hashed.split(':')
-        return hashlib.pbkdf2_hmac('sha256', data.encode(), salt.encode(), 100000).hex() == hash_part
-    except:
+    except (AttributeError, ValueError):
         return False
+    computed = hashlib.pbkdf2_hmac('sha256', data.encode(), salt.encode(), 100000).hex()
+    # Constant-time so response timing never reveals how much of the hash matched
+    return hmac.compare_digest(computed, hash_part)
+
+
+# Headers SecurityMiddleware adds to every response
+_SECURITY_HEADERS = (
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'DENY'),
+    ('X-XSS-Protection', '1; mode=block'),
+    ('Referrer-Policy', 'strict-origin-when-cross-origin'),
+)
 
 
 class SecurityMiddleware:
@@ -214,60 +346,117 @@ class SecurityMiddleware:
     def __call__(self, request):
         response = self.get_response(request)
         
-        # Add security headers
-        response['X-Content-Type-Options'] = 'nosniff'
-        response['X-Frame-Options'] = 'DENY'
-        response['X-XSS-Protection'] = '1; mode=block'
-        response['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+        # Add security headers, leaving any a view already set
+        headers = response.headers
+        for name, value in _SECURITY_HEADERS:
+            headers.setdefault(name, value)
         
         return response
 
 
+# str.translate table deleting every ASCII character except 0-9
+_DROP_ASCII_NON_DIGITS = str.maketrans('', '', ''.join(chr(c) for c in range(128) if not chr(c).isdigit()))
+
+
+def _strip(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def _lower(value):
+    return value.lower()
+
+
+def _phone_digits(value):
+    value = value.translate(_DROP_ASCII_NON_DIGITS)
+    if not value.isascii():
+        # Rare non-ASCII input, keep exactly what str.isdigit keeps
+        value = ''.join(filter(str.isdigit, value))
+    if value.startswith('0'):
+        value = '+256' + value[1:]  # Convert to international format for Uganda
+    return value
+
+
+def _max_length_check(field, max_length):
+    def check(value):
+        if len(str(value)) > max_length:
+            raise ValueError(f"{field} exceeds maximum length of {max_length}")
+        return value
+    return check
+
+
+def _min_length_check(field, min_length):
+    def check(value):
+        if len(str(value)) < min_length:
+            raise ValueError(f"{field} must be at least {min_length} characters")
+        return value
+    return check
+
+
+def _compile_field(field, rule):
+    """Chain only the steps this field's rule needs, so no rule lookups are left for call time."""
+    steps = [_strip]
+    if rule.get('type') == 'email':
+        steps.append(_lower)
+    elif rule.get('type') == 'phone':
+        steps.append(_phone_digits)
+    if 'max_length' in rule:
+        steps.append(_max_length_check(field, rule['max_length']))
+    if 'min_length' in rule:
+        steps.append(_min_length_check(field, rule['min_length']))
+
+    def clean(value):
+        for step in steps:
+            value = step(value)
+        return value
+    return clean
+
+
+# Compiled validators by schema: id(field_rules) -> (field_rules, validator)
+COMPILED_VALIDATORS_MAX_SIZE = 128
+_compiled_validators = {}
+
+
+def build_validator(field_rules):
+    """
+    Compile field rules once into a validator taking the input data and returning the cleaned data.
+    """
+    cached = _compiled_validators.get(id(field_rules))
+    if cached is not None and cached[0] is field_rules:
+        return cached[1]
+
+    cleaners = {field: _compile_field(field, rule) for field, rule in field_rules.items()}
+
+    def validate(data):
+        return {field: cleaners[field](value) for field, value in data.items() if field in cleaners}
+
+    # Schemas built per call would pile up, start over rather than grow without bound
+    if len(_compiled_validators) >= COMPILED_VALIDATORS_MAX_SIZE:
+        _compiled_validators.clear()
+    # Holding the schema keeps its id from being reused by another dict
+    _compiled_validators[id(field_rules)] = (field_rules, validate)
+    return validate
+
+
 def clean_and_validate_input(data, field_rules):
     """
     Clean and validate input data based on field rules.
     """
-    cleaned_data = {}
-    
-    for field, value in data.items():
-        if field in field_rules:
-            rule = field_rules[field]
-            
-            # Strip whitespace
-            if isinstance(value, str):
-                value = value.strip()
-            
-            # Apply field-specific cleaning
-            if rule.get('type') == 'email':
-                value = value.lower()
-            elif rule.get('type') == 'phone':
-                value = ''.join(filter(str.isdigit, value))
-                if value.startswith('0'):
-                    value = '+256' + value[1:]  # Convert to international format for Uganda
-            
-            # Length validation
-            if 'max_length' in rule and len(str(value)) > rule['max_length']:
-                raise ValueError(f"{field} exceeds maximum length of {rule['max_length']}")
-            
-            if 'min_length' in rule and len(str(value)) < rule['min_length']:
-                raise ValueError(f"{field} must be at least {rule['min_length']} characters")
-            
-            cleaned_data[field] = value
-    
-    return cleaned_data
+    return build_validator(field_rules)(data)
+
+
+# Landing page per role
+DASHBOARD_URLS = {
+    'admin': '/admin/dashboard/',
+    'vendor': '/vendor/dashboard/',
+    'buyer': '/buyer/dashboard/'
+}
 
 
 def get_user_dashboard_url(user):
     """
     Get the appropriate dashboard URL based on user role.
     """
-    dashboard_urls = {
-        'admin': '/admin/dashboard/',
-        'vendor': '/vendor/dashboard/',
-        'buyer': '/buyer/dashboard/'
-    }
-    
-    return dashboard_urls.get(user.role, '/dashboard/')
+    return DASHBOARD_URLS.get(user.role, '/dashboard/')
 
 
 def check_user_permissions(user, required_permissions):
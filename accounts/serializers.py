@@ -3,9 +3,10 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import timedelta
 
 from django.db import transaction
+from django.db.models import QuerySet
 from django.utils import timezone
-from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.signals import user_login_failed
 from django.core.cache import cache
 
 from .models import (
@@ -13,6 +14,8 @@ from .models import (
     UserActivityLog, ArchiveUser, EmailVerification,
     PasswordReset,
 )
+from .authentication import AUTH_USER_RELATED
+from .security import generate_cache_key, invalidate_user_cache
 
 import re
 import logging
@@ -21,6 +24,38 @@ import uuid
 
 logger = logging.getLogger('accounts.security')
 
+# Profile relation that holds each role's extra data
+ROLE_PROFILE_RELATIONS = {
+    'admin': 'admin_profile',
+    'vendor': 'vendor_profile',
+    'buyer': 'buyer_profile',
+}
+
+# Columns the login path reads: the checks, the token and the returned user dict
+LOGIN_USER_FIELDS = (
+    'id', 'username', 'password', 'status', 'is_active', 'login_attempts',
+    'account_locked_until', 'full_name', 'email', 'role', 'phone', 'location',
+    'first_name', 'last_name', 'profile_image',
+)
+
+# Validation patterns, compiled once at import. Used with fullmatch and ASCII-only \d,
+# so a trailing newline or non-Latin digits never pass; none nest quantifiers, so matching stays linear
+_USERNAME_RE = re.compile(r'[a-zA-Z0-9_]+', re.ASCII)
+_PHONE_STRIP_RE = re.compile(r'[^\d+]', re.ASCII)
+_PHONE_RE = re.compile(r'\+?[1-9]\d{8,14}', re.ASCII)
+
+# str.translate table deleting every ASCII character except 0-9 and +
+_PHONE_DROP_ASCII = str.maketrans('', '', ''.join(chr(c) for c in range(128) if chr(c) not in '0123456789+'))
+
+
+def _clean_phone(value):
+    """Strip spaces and separators from a phone number, keeping digits and +."""
+    value = value.translate(_PHONE_DROP_ASCII)
+    if not value.isascii():
+        # Rare non-ASCII input, let the regex drop the rest
+        value = _PHONE_STRIP_RE.sub('', value)
+    return value
+
 
 # Serializer for adding an email to the account for 2FA
 class AddEmailSerializer(serializers.Serializer):
@@ -71,7 +106,7 @@ class UserRegistrationSerializer(serializers.Serializer):
     
     def validate_username(self, value):
         # validate username format
-        if not re.match(r'^[a-zA-Z0-9_]+$', value):
+        if not _USERNAME_RE.fullmatch(value):
             raise serializers.ValidationError('Username can only contain letters, numbers, and underscores')
         if len(value) < 4:
             raise serializers.ValidationError('Username must be atleast four characters long')
@@ -81,8 +116,8 @@ class UserRegistrationSerializer(serializers.Serializer):
         # validate and clean the phone
         if value:
             # remove spaces and special characters
-            phone_clean = re.sub(r'[^\d+]', '', value)
-            if not re.match(r'^\+?[1-9]\d{8,14}$', phone_clean):
+            phone_clean = _clean_phone(value)
+            if not _PHONE_RE.fullmatch(phone_clean):
                 raise serializers.ValidationError('Please enter a valid phone number')
             return phone_clean
         return value
@@ -104,6 +139,7 @@ class UserRegistrationSerializer(serializers.Serializer):
         attrs.pop('confirm_password')
         return attrs
     
+    @transaction.atomic
     def create(self, validated_data):
         # create user with encrypted data and default profile
 
@@ -113,11 +149,17 @@ class UserRegistrationSerializer(serializers.Serializer):
             base_username = validated_data.get('phone')
             username = base_username
 
-            # Check if username exists and make it unique if needed
-            counter = 1
-            while User.objects.filter(username=username).exists():
-                username = f"{base_username}_{counter}"
-                counter += 1
+            # Check if username exists and make it unique if needed: fetch only the base and its
+            # numbered variants in one query, then take the next suffix after the highest
+            taken = set(
+                User.objects.filter(
+                    username__startswith=base_username,
+                    username__regex=rf'^{re.escape(base_username)}(_[0-9]+)?$',
+                ).values_list('username', flat=True)
+            )
+            if username in taken:
+                suffixes = (int(name.rpartition('_')[2]) for name in taken if name != base_username)
+                username = f"{base_username}_{max(suffixes, default=0) + 1}"
             
             validated_data['username'] = username
 
@@ -172,8 +214,8 @@ class VendorRegistrationSerializer(serializers.Serializer):
         """Validate and clean the phone."""
         if value:
             # remove spaces and special characters
-            phone_clean = re.sub(r'[^\d+]', '', value)
-            if not re.match(r'^\+?[1-9]\d{8,14}$', phone_clean):
+            phone_clean = _clean_phone(value)
+            if not _PHONE_RE.fullmatch(phone_clean):
                 raise serializers.ValidationError('Please enter a valid phone number')
             return phone_clean
         return value
@@ -184,9 +226,10 @@ class VendorRegistrationSerializer(serializers.Serializer):
             raise serializers.ValidationError("Passwords do not match.")
         return attrs
     
+    @transaction.atomic
     def create(self, validated_data):
         """
-        Create vendor with profile
+        Create vendor with profile; the user and its profile commit together
         """
         # Remove password_confirm from validated data
         validated_data.pop('password_confirm', None)
@@ -238,7 +281,7 @@ class UserLoginSerializer(serializers.Serializer):
         
         # try to get user by phone or email
         try:
-            user = User.objects.get(username=username)
+            user = User.objects.only(*LOGIN_USER_FIELDS).get(username=username)
 
             # Check if the account is locked
             if user.is_account_locked():
@@ -249,16 +292,14 @@ class UserLoginSerializer(serializers.Serializer):
                 raise serializers.ValidationError(f"Account is {user.status}. Please contact administrator.")
         
             
-            # Authenticate with phone and password
-            authenticated_user = authenticate(username=username, password=password)
-            if not authenticated_user:
-                self._handle_failed_login(username)
+            # Check the password on the row already loaded, authenticate() would fetch it again
+            if not (user.check_password(password) and user.is_active):
+                self._handle_failed_login(user)
+                self._login_failed(username)
                 raise serializers.ValidationError("Invalid credentials.")
             
             # Reset login attempts after successful login
-            if user.login_attempts > 0:
-                user.login_attempts = 0
-                user.save(update_fields=['login_attempts'])
+            user.reset_login_attempts()
 
             # Generate tokens
             refresh = RefreshToken.for_user(user)
@@ -280,25 +321,25 @@ class UserLoginSerializer(serializers.Serializer):
             }
         
         except User.DoesNotExist:
+            # Run the hasher anyway so response time doesn't reveal which usernames exist
+            User().set_password(password)
+            self._login_failed(username)
             raise serializers.ValidationError("Invalid credentials.")
-        
-    
-    def _handle_failed_login(self, username):
+
+    def _login_failed(self, username):
+        """Send the user_login_failed signal that authenticate() would have sent."""
+        user_login_failed.send(
+            sender=__name__,
+            credentials={'username': username},
+            request=self.context.get('request'),
+        )
+
+    def _handle_failed_login(self, user):
         """Handle failed login attempts with account locking."""
 
-        try:
-            user = User.objects.get(username=username)
-            user.login_attempts += 1
-            
-            # Lock account after 5 failed attempts
-            if user.login_attempts >= 5:
-                user.lock_account(duration_minutes=30)
-                logger.warning(f"Account locked for user: {username}")
-            
-            user.save(update_fields=['login_attempts'])
-            
-        except User.DoesNotExist:
-            pass  # Don't reveal if username exists
+        # Lock account after 5 failed attempts
+        if user.register_failed_login(max_attempts=5, duration_minutes=30):
+            logger.warning(f"Account locked for user: {user.username}")
 
 
 # Profule update
@@ -352,8 +393,8 @@ class ProfileUpdateSerializer(serializers.Serializer):
         """Validate phone format and uniqueness."""
         if value:
             # Clean phone number
-            phone_clean = re.sub(r'[^\d+]', '', value)
-            if not re.match(r'^\+?[1-9]\d{8,14}$', phone_clean):
+            phone_clean = _clean_phone(value)
+            if not _PHONE_RE.fullmatch(phone_clean):
                 raise serializers.ValidationError('Please enter a valid phone number')
             
             # Check uniqueness
@@ -386,6 +427,7 @@ class ProfileUpdateSerializer(serializers.Serializer):
         
         return attrs
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update both user model and related profile model."""
         # Extract profile-specific data
@@ -407,33 +449,37 @@ class ProfileUpdateSerializer(serializers.Serializer):
             if field in validated_data:
                 buyer_data[field] = validated_data.pop(field)
 
-        # Update user model
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        # Update user model, writing only the submitted columns
+        if validated_data:
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            update_fields = [*validated_data, 'updated_at']
+            if 'full_name' in validated_data:
+                # save() blanks the split name fields whenever full_name is set
+                update_fields += ['first_name', 'last_name']
+            instance.save(update_fields=update_fields)
 
         # Update role-specific profile
         if instance.role == 'admin' and admin_data and hasattr(instance, 'admin_profile'):
             admin_profile = instance.admin_profile
             for attr, value in admin_data.items():
                 setattr(admin_profile, attr, value)
-            admin_profile.save()
+            admin_profile.save(update_fields=list(admin_data))
         
         elif instance.role == 'vendor' and vendor_data and hasattr(instance, 'vendor_profile'):
             vendor_profile = instance.vendor_profile
             for attr, value in vendor_data.items():
                 setattr(vendor_profile, attr, value)
-            vendor_profile.save()
+            vendor_profile.save(update_fields=list(vendor_data))
         
         elif instance.role == 'buyer' and buyer_data and hasattr(instance, 'buyer_profile'):
             buyer_profile = instance.buyer_profile
             for attr, value in buyer_data.items():
                 setattr(buyer_profile, attr, value)
-            buyer_profile.save()     
+            buyer_profile.save(update_fields=list(buyer_data))
 
         # Invalidate cache
-        cache_key = f"user_profile_{instance.id}"
-        cache.delete(cache_key)
+        invalidate_user_cache(instance.id)
 
         # Log profile update
         logger.info(f"Profile updated for user: {instance.username}")  
@@ -445,6 +491,9 @@ class ProfileUpdateSerializer(serializers.Serializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for user profile with role-specific information.
+
+    Querysets serialized with many=True are joined to the role profiles automatically;
+    single users should come from the auth backend or setup_eager_loading() to skip the profile query.
     """
     profile_data = serializers.SerializerMethodField()
     
@@ -458,42 +507,60 @@ class UserProfileSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id', 'role', 'wallet', 'referral_points', 'date_joined')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Join the role profiles so serializing many users costs no query per user."""
+        return queryset.select_related(*AUTH_USER_RELATED)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # Lists always join the profiles, so no caller can reintroduce a query per user
+        if args and isinstance(args[0], QuerySet):
+            args = (cls.setup_eager_loading(args[0]),) + args[1:]
+        elif isinstance(kwargs.get('instance'), QuerySet):
+            kwargs['instance'] = cls.setup_eager_loading(kwargs['instance'])
+        return super().many_init(*args, **kwargs)
+
     def get_profile_data(self, obj):
         """Get role-specific profile data."""
-        cache_key = f"user_profile_{obj.id}"
+        relation = ROLE_PROFILE_RELATIONS.get(obj.role)
+        if relation is None:
+            return {}
+
+        # A profile already joined (setup_eager_loading, the auth backend) is read directly, no cache trip
+        if getattr(User, relation).is_cached(obj):
+            return self._build_profile_data(obj.role, getattr(obj, relation, None))
+
+        cache_key = generate_cache_key('profile', obj.id)
         profile_data = cache.get(cache_key)
         
         if profile_data is None:
-            try:
-                if obj.role == 'admin':
-                    profile = obj.admin_profile
-                    profile_data = {
-                        'department': profile.department,
-                        'permissions': profile.permissions
-                    }
-                elif obj.role == 'vendor':
-                    profile = obj.vendor_profile
-                    profile_data = {
-                        'business_type': profile.business_type,
-                        'commission_rate': str(profile.commission_rate),
-                        'is_verified_vendor': profile.is_verified_vendor,
-                        'business_registration_number': profile.business_registration_number
-                    }
-                elif obj.role == 'buyer':
-                    profile = obj.buyer_profile
-                    profile_data = {
-                        'loyalty_tier': profile.loyalty_tier,
-                        'delivery_address': profile.delivery_address,
-                        'secondary_phone': profile.secondary_phone
-                    }
-                else:
-                    profile_data = {}
-                
-                cache.set(cache_key, profile_data, 300)  # Cache for 5 minutes
-            except:
-                profile_data = {}
+            # getattr absorbs RelatedObjectDoesNotExist (an AttributeError) for a missing profile row
+            profile_data = self._build_profile_data(obj.role, getattr(obj, relation, None))
+            cache.set(cache_key, profile_data, 300)  # Cache for 5 minutes
         
         return profile_data
+
+    def _build_profile_data(self, role, profile):
+        if profile is None:
+            return {}
+        if role == 'admin':
+            return {
+                'department': profile.department,
+                'permissions': profile.permissions
+            }
+        elif role == 'vendor':
+            return {
+                'business_type': profile.business_type,
+                'commission_rate': str(profile.commission_rate),
+                'is_verified_vendor': profile.is_verified_vendor,
+                'business_registration_number': profile.business_registration_number
+            }
+        return {
+            'loyalty_tier': profile.loyalty_tier,
+            'delivery_address': profile.delivery_address,
+            'secondary_phone': profile.secondary_phone
+        }
     
     def validate_email(self, value):
         """Validate email uniqueness excluding current user."""
@@ -504,8 +571,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """Update user profile with cache invalidation."""
         # Invalidate cache
-        cache_key = f"user_profile_{instance.id}"
-        cache.delete(cache_key)
+        invalidate_user_cache(instance.id)
         
         return super().update(instance, validated_data)
 
@@ -599,6 +665,7 @@ class UserDeleteSerializer(serializers.Serializer):
             raise serializers.ValidationError("Password is incorrect.")
         return value
     
+    @transaction.atomic
     def save(self):
         """
         Handle the account deletion process.
@@ -651,6 +718,28 @@ class PasswordResetRequestSerializer(serializers.Serializer):
         return email
 
 
+def _lookup_password_reset(email, code):
+    """Return the unused reset for this email and code, with its user joined in the same query."""
+    # The reset row is only checked and flagged, so skip its other columns
+    reset = PasswordReset.objects.select_related('user').only('expires_at', 'is_used', 'user').filter(
+        user__email=email,
+        email=email,
+        verification_code=code,
+        is_used=False
+    ).first()
+
+    if not reset:
+        # Only a miss pays for telling an unknown email apart from a wrong code
+        if not User.objects.filter(email=email).exists():
+            raise serializers.ValidationError("Invalid email address.")
+        raise serializers.ValidationError("Invalid verification code.")
+
+    if reset.is_expired():
+        raise serializers.ValidationError("Verification code has expired.")
+
+    return reset
+
+
 # Password Verification via email reset
 class PasswordResetVerifySerializer(serializers.Serializer):
     """
@@ -663,26 +752,9 @@ class PasswordResetVerifySerializer(serializers.Serializer):
         email = attrs['email'].lower()
         code = attrs['verification_code']
 
-        try:
-            user = User.objects.get(email=email)
-            reset = PasswordReset.objects.filter(
-                user=user,
-                email=email,
-                verification_code=code,
-                is_used=False
-            ).first()
-            
-            if not reset:
-                raise serializers.ValidationError("Invalid verification code.")
-            
-            if reset.is_expired():
-                raise serializers.ValidationError("Verification code has expired.")
-            
-            attrs['reset_instance'] = reset
-            attrs['user'] = user
-            
-        except User.DoesNotExist:
-            raise serializers.ValidationError("Invalid email address.")
+        reset = _lookup_password_reset(email, code)
+        attrs['reset_instance'] = reset
+        attrs['user'] = reset.user
         
         return attrs
     
@@ -704,26 +776,9 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         email = attrs['email'].lower()
         code = attrs['verification_code']
         
-        try:
-            user = User.objects.get(email=email)
-            reset = PasswordReset.objects.filter(
-                user=user,
-                email=email,
-                verification_code=code,
-                is_used=False
-            ).first()
-            
-            if not reset:
-                raise serializers.ValidationError("Invalid verification code.")
-            
-            if reset.is_expired():
-                raise serializers.ValidationError("Verification code has expired.")
-            
-            attrs['reset_instance'] = reset
-            attrs['user'] = user
-            
-        except User.DoesNotExist:
-            raise serializers.ValidationError("Invalid email address.")
+        reset = _lookup_password_reset(email, code)
+        attrs['reset_instance'] = reset
+        attrs['user'] = reset.user
         
         return attrs
     
@@ -744,7 +799,7 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         
         # Mark reset as used
         reset.is_used = True
-        reset.save()
+        reset.save(update_fields=['is_used'])
         
         return user
 
@@ -0,0 +1,61 @@
+# Keep the shared auth user cache and per-user caches in step with the database
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .models import User, VendorProfile, BuyerProfile, AdminProfile
+from .security import PERMISSION_FIELDS, cache_user_permissions, invalidate_user_cache
+
+
+def invalidate_user_caches(user_ids):
+    # For bulk UPDATEs, which skip the post_save handlers below
+    for user_id in user_ids:
+        invalidate_cached_user(user_id)
+        invalidate_user_cache(user_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cache_on_save(sender, instance, update_fields=None, **kwargs):
+    invalidate_cached_user(instance.pk)
+    if update_fields is not None and PERMISSION_FIELDS.isdisjoint(update_fields):
+        return
+    # Write-through: retire the user's cached entries and store fresh permissions right away
+    invalidate_user_cache(instance.pk)
+    cache_user_permissions(instance)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_cache_on_delete(sender, instance, **kwargs):
+    invalidate_user_caches([instance.pk])
+
+
+# Role profiles ride along with the cached user and profile data, so profile writes drop both
+@receiver(post_save, sender=BuyerProfile)
+@receiver(post_delete, sender=BuyerProfile)
+@receiver(post_save, sender=AdminProfile)
+@receiver(post_delete, sender=AdminProfile)
+def invalidate_user_cache_on_profile_change(sender, instance, **kwargs):
+    invalidate_user_caches([instance.user_id])
+
+
+def sync_vendor_verification(user_ids, is_verified):
+    # A single UPDATE, no User.save() cascade, so clear the caches by hand
+    User.objects.filter(pk__in=user_ids).update(is_verified_vendor=is_verified)
+    invalidate_user_caches(user_ids)
+
+
+@receiver(post_save, sender=VendorProfile)
+def copy_vendor_verification_on_save(sender, instance, update_fields=None, **kwargs):
+    # Saves that leave the flag out (e.g. profile edits) skip the User UPDATE; any other save
+    # only writes the user row if its copy actually differs
+    if update_fields is None or 'is_verified_vendor' in update_fields:
+        User.objects.filter(pk=instance.user_id).exclude(
+            is_verified_vendor=instance.is_verified_vendor
+        ).update(is_verified_vendor=instance.is_verified_vendor)
+    # The profile rides along with the cached user and profile data, as for the other roles
+    invalidate_user_caches([instance.user_id])
+
+
+@receiver(post_delete, sender=VendorProfile)
+def clear_vendor_verification_on_delete(sender, instance, **kwargs):
+    sync_vendor_verification([instance.user_id], False)
@@ -1,12 +1,18 @@
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.template.defaultfilters import date as date_filter
 from django.template.loader import render_to_string
+from django.db import DatabaseError
+from django.utils.dateparse import parse_datetime
+from django.utils.html import strip_tags
+from django_redis import get_redis_connection
 
-from .models import EmailVerification
+from .models import EmailVerification, User, UserActivityLog
 from .utils.utils import mailer
 
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -110,17 +116,118 @@ def send_password_reset_email_task(self, reset_id):
         logger.error(f"Password reset email task failed: {str(e)}")
         raise
 
-@shared_task(bind=True, max_retries=3)
-def send_email_task(self, to, subject, template_name, context, bcc=None, copy_admin=False):
-    """Generic email sending task."""
+@shared_task(queue='email_queue', bind=True, max_retries=3)
+def send_email_task(self, to, subject, html, from_email=None):
+    """Generic HTML email task, so request handlers never wait on SMTP."""
+    from django.core.mail import EmailMultiAlternatives
+
     try:
-        return mailer.send_template(
-            to=to,
-            subject=subject,
-            template_name=template_name,
-            context=context,
-            bcc=bcc,
-            copy_admin=copy_admin,
+        msg = EmailMultiAlternatives(
+            subject, strip_tags(html), from_email or settings.DEFAULT_FROM_EMAIL, [to]
         )
+        msg.attach_alternative(html, 'text/html')
+        return msg.send() == 1
     except Exception as e:
-        raise self.retry(exc=e, countdown=30)  # retry after 30s
\ No newline at end of file
+        raise self.retry(exc=e, countdown=30)  # retry after 30s
+
+
+ACTIVITY_LOG_FLUSH_SIZE = 500
+# Database failures a batch may hit before it is dead-lettered instead of retried
+ACTIVITY_LOG_MAX_ATTEMPTS = 5
+# Newest dead-lettered events kept for inspection
+ACTIVITY_LOG_DEAD_MAX = 10000
+# Longest a flush may hold the lock, so a killed worker never blocks the next one for good
+ACTIVITY_LOG_LOCK_TTL = 300  # seconds
+
+
+def _activity_log_rows(entries):
+    """
+    Build log rows from queued events.
+
+    Returns (rows, dead): entries that cannot become a row (bad JSON, unknown fields, an unparsable
+    created_at) are returned in dead, events of users deleted meanwhile are dropped with a warning.
+    """
+    events, dead = [], []
+    for raw in entries:
+        try:
+            event = json.loads(raw)
+            event['created_at'] = parse_datetime(event['created_at'])
+            if event['created_at'] is None:
+                raise ValueError("unparsable created_at")
+            events.append((raw, UserActivityLog(**event)))
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error("Dead-lettering malformed activity log event: %s", e)
+            dead.append(raw)
+
+    user_ids = {row.user_id for _, row in events}
+    existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+
+    rows = []
+    for _, row in events:
+        if row.user_id not in existing:
+            logger.warning("Dropping activity log for deleted user %s: %s", row.user_id, row.action)
+            continue
+        rows.append(row)
+    return rows, dead
+
+
+@shared_task(ignore_result=True)
+def flush_activity_logs():
+    """
+    Bulk-insert activity log rows buffered in Redis by log_user_activity.
+
+    Each batch is moved to a processing list before the insert and only removed once it is committed,
+    so a worker dying mid-flush leaves the batch for the next run. Malformed events go to a dead-letter
+    list; a batch the database keeps rejecting is dead-lettered after ACTIVITY_LOG_MAX_ATTEMPTS runs.
+    """
+    from .security import ACTIVITY_LOG_QUEUE
+
+    # Same prefixed name log_user_activity pushes to, the derived keys keep its hash tag
+    queue_key = cache.make_key(ACTIVITY_LOG_QUEUE)
+    processing_key = f"{queue_key}:processing"
+    attempts_key = f"{queue_key}:attempts"
+    dead_key = f"{queue_key}:dead"
+    lock_key = f"{queue_key}:lock"
+
+    conn = get_redis_connection("default")
+    # One flusher at a time, the processing list belongs to whoever holds the lock
+    if not conn.set(lock_key, 1, nx=True, ex=ACTIVITY_LOG_LOCK_TTL):
+        return 0
+
+    total = 0
+    try:
+        while True:
+            # A batch left over by a failed or killed run goes first
+            entries = conn.lrange(processing_key, 0, -1)
+            if not entries:
+                # LMOVE in one MULTI/EXEC, the batch leaves the queue only by landing in processing
+                pipe = conn.pipeline()
+                for _ in range(ACTIVITY_LOG_FLUSH_SIZE):
+                    pipe.lmove(queue_key, processing_key, 'LEFT', 'RIGHT')
+                entries = [entry for entry in pipe.execute() if entry is not None]
+                if not entries:
+                    break
+
+            rows, dead = _activity_log_rows(entries)
+            try:
+                UserActivityLog.objects.bulk_create(rows, batch_size=ACTIVITY_LOG_FLUSH_SIZE)
+            except DatabaseError:
+                if conn.incr(attempts_key) < ACTIVITY_LOG_MAX_ATTEMPTS:
+                    # Left in processing, the next run retries it before anything newer
+                    raise
+                logger.exception("Dead-lettering %s activity log events after repeated failures", len(entries))
+                dead, rows = entries, []
+
+            pipe = conn.pipeline()
+            if dead:
+                pipe.rpush(dead_key, *dead)
+                pipe.ltrim(dead_key, -ACTIVITY_LOG_DEAD_MAX, -1)
+            pipe.delete(processing_key, attempts_key)
+            pipe.execute()
+            total += len(rows)
+
+            if len(entries) < ACTIVITY_LOG_FLUSH_SIZE:
+                break
+    finally:
+        conn.delete(lock_key)
+    return total
@@ -1,17 +1,28 @@
 from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.db import IntegrityError, transaction
+from django.db import DatabaseError, IntegrityError, transaction
 from django.core.exceptions import ValidationError
-from django.db.models import Q
+from django.db.models import Q, QuerySet
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.http import HttpResponse
 
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from rest_framework.request import Request
+from rest_framework.parsers import JSONParser
 from rest_framework import status
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from decimal import Decimal
+import hashlib
+import json
+import time
+from io import StringIO
 from datetime import timedelta
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, PropertyMock
 
 from .models import (
     User, AdminProfile, BuyerProfile, VendorProfile, 
@@ -19,8 +30,18 @@ from .models import (
 )
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, 
-    ProfileUpdateSerializer, AddEmailSerializer
+    ProfileUpdateSerializer, AddEmailSerializer, UserProfileSerializer, UserDeleteSerializer,
+    PasswordResetVerifySerializer, PasswordResetConfirmSerializer,
 )
+from . import authentication
+from .authentication import CookieJWTAuthentication, forget_token, invalidate_cached_user
+from .tasks import send_email_task, flush_activity_logs, ACTIVITY_LOG_MAX_ATTEMPTS
+from .security import (
+    log_user_activity, cache_user_permissions, check_rate_limit, is_suspicious_activity,
+    secure_hash, verify_secure_hash, generate_cache_key, invalidate_user_cache,
+    get_cached_user_permissions, clean_and_validate_input, build_validator, SecurityMiddleware, ACTIVITY_LOG_QUEUE,
+)
+from .permissions import PreventRoleEscalation, CanCreateVendor, RateLimitPermission, IsVerifiedVendor
 
 User = get_user_model()
 
@@ -47,8 +68,11 @@ class UserModelTest(TestCase):
 
     def test_user_str_representation(self):
         user = User.objects.create_user(**self.user_data)
-        expected_str = f"{user.first_name} {user.last_name} ({user.role})"
-        self.assertEqual(str(user), expected_str)
+        self.assertEqual(str(user), 'Test User')
+
+        # Falls back to the username when no full name is set
+        user.full_name = ''
+        self.assertEqual(str(user), 'testuser')
 
     def test_user_account_lock_unlock(self):
         user = User.objects.create_user(**self.user_data)
@@ -63,6 +87,25 @@ class UserModelTest(TestCase):
         self.assertFalse(user.is_account_locked())
         self.assertEqual(user.login_attempts, 0)
 
+    def test_register_failed_login_locks_on_last_attempt(self):
+        user = User.objects.create_user(**self.user_data)
+
+        for _ in range(4):
+            self.assertFalse(user.register_failed_login(max_attempts=5))
+        self.assertEqual(user.login_attempts, 4)
+
+        self.assertTrue(user.register_failed_login(max_attempts=5))
+        self.assertEqual(user.login_attempts, 5)
+        self.assertTrue(User.objects.get(pk=user.pk).is_account_locked())
+
+    def test_with_locked_flag_matches_is_account_locked(self):
+        locked = User.objects.create_user(**self.user_data)
+        locked.lock_account(duration_minutes=30)
+        User.objects.create_user(username='free', email='free@example.com', role='buyer')
+
+        flagged = User.objects.with_locked_flag().filter(is_locked=True)
+        self.assertEqual(list(flagged.values_list('username', flat=True)), ['testuser'])
+
     def test_wallet_operations(self):
         user = User.objects.create_user(**self.user_data)
         
@@ -78,6 +121,20 @@ class UserModelTest(TestCase):
         user.refresh_from_db()
         self.assertEqual(user.wallet, Decimal('100.50'))
 
+    def test_wallet_updates_do_not_lose_concurrent_changes(self):
+        user = User.objects.create_user(**self.user_data)
+        stale_copy = User.objects.get(pk=user.pk)
+
+        # Both instances start from 0.00; each add must build on the stored value
+        user.add_wallet_balance(10)
+        stale_copy.add_wallet_balance(5)
+        self.assertEqual(stale_copy.wallet, Decimal('15.00'))
+
+        # Deducting more than the balance leaves it untouched
+        self.assertFalse(user.deduct_wallet_balance(20))
+        self.assertTrue(user.deduct_wallet_balance(15))
+        self.assertEqual(user.wallet, Decimal('0.00'))
+
     def test_user_manager_role_filters(self):
         User.objects.create_user(username='admin1', email='admin@test.com', role='admin')
         User.objects.create_user(username='vendor1', email='vendor@test.com', role='vendor')
@@ -87,6 +144,18 @@ class UserModelTest(TestCase):
         self.assertEqual(User.objects.vendors().count(), 1)
         self.assertEqual(User.objects.buyers().count(), 1)
 
+        # Role helpers load a narrow projection unless the full row is asked for
+        vendor = User.objects.vendors().get()
+        self.assertEqual(vendor.get_deferred_fields() & {'username', 'email', 'role'}, set())
+        self.assertIn('wallet', vendor.get_deferred_fields())
+        self.assertEqual(User.objects.vendors(full=True).get().get_deferred_fields(), set())
+
+    def test_email_stored_lowercase(self):
+        user = User.objects.create_user(username='mixed', email='Mixed.Case@Example.com', role='buyer')
+        user.refresh_from_db()
+        self.assertEqual(user.email, 'mixed.case@example.com')
+        self.assertTrue(User.objects.filter(email='mixed.case@example.com').exists())
+
     def test_email_uniqueness(self):
         User.objects.create_user(**self.user_data)
         
@@ -168,6 +237,33 @@ class EmailVerificationModelTest(TestCase):
         self.assertEqual(len(verification.verification_code), 6)
         self.assertFalse(verification.verified)
 
+    def test_create_fresh_replaces_pending_code(self):
+        first = EmailVerification.create_fresh(user=self.user, email=self.user.email, user_type='buyer')
+        second = EmailVerification.create_fresh(user=self.user, email=self.user.email, user_type='buyer')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(EmailVerification.objects.filter(user=self.user, verified=False).count(), 1)
+
+    def test_create_fresh_racing_insert_updates_the_winner(self):
+        first = EmailVerification.create_fresh(user=self.user, email=self.user.email, user_type='buyer')
+        real_get = QuerySet.get
+        missed = []
+
+        def racing_get(queryset, *args, **kwargs):
+            # The first lookup runs before the other caller's INSERT was visible
+            if not missed:
+                missed.append(True)
+                raise EmailVerification.DoesNotExist
+            return real_get(queryset, *args, **kwargs)
+
+        with patch.object(QuerySet, 'get', racing_get):
+            second = EmailVerification.create_fresh(user=self.user, email=self.user.email, user_type='vendor')
+
+        self.assertEqual(second.pk, first.pk)
+        pending = EmailVerification.objects.get(user=self.user, verified=False)
+        self.assertEqual(pending.user_type, 'vendor')
+        self.assertEqual(pending.verification_code, second.verification_code)
+
     def test_mark_verified(self):
         verification = EmailVerification.create_fresh(
             user=self.user,
@@ -175,13 +271,27 @@ class EmailVerificationModelTest(TestCase):
             user_type='buyer'
         )
         
-        verification.mark_verified()
+        with self.assertNumQueries(2):
+            verification.mark_verified()
         self.assertTrue(verification.verified)
         self.assertIsNotNone(verification.verified_at)
         
         self.user.refresh_from_db()
         self.assertTrue(self.user.email_verified)
 
+    def test_mark_verified_fills_a_blank_email(self):
+        User.objects.filter(pk=self.user.pk).update(email='')
+        verification = EmailVerification.create_fresh(
+            user=self.user,
+            email='Fresh@Example.com',
+            user_type='buyer'
+        )
+
+        verification.mark_verified()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'fresh@example.com')
+
     def test_generate_code_format(self):
         code = EmailVerification.generate_code()
         self.assertEqual(len(code), 6)
@@ -226,6 +336,30 @@ class ProfileModelTest(TestCase):
         self.assertEqual(profile.commission_rate, Decimal('5.00'))
         self.assertFalse(profile.is_verified_vendor)
 
+    def test_vendor_verification_mirrored_on_user(self):
+        profile = VendorProfile.objects.create(user=self.vendor_user, is_verified_vendor=True)
+        self.vendor_user.refresh_from_db()
+        self.assertTrue(self.vendor_user.is_verified_vendor)
+
+        # The permission reads the mirrored flag without touching the profile
+        request = APIRequestFactory().get('/api/products/')
+        request.user = self.vendor_user
+        with self.assertNumQueries(0):
+            self.assertTrue(IsVerifiedVendor().has_permission(request, None))
+
+        profile.delete()
+        self.vendor_user.refresh_from_db()
+        self.assertFalse(self.vendor_user.is_verified_vendor)
+
+    def test_vendor_profile_edit_skips_the_user_update(self):
+        profile = VendorProfile.objects.create(user=self.vendor_user, is_verified_vendor=True)
+
+        profile.commission_rate = Decimal('7.50')
+        with self.assertNumQueries(1):
+            profile.save(update_fields=['commission_rate'])
+        self.vendor_user.refresh_from_db()
+        self.assertTrue(self.vendor_user.is_verified_vendor)
+
     def test_buyer_profile_creation(self):
         profile = BuyerProfile.objects.create(
             user=self.buyer_user,
@@ -274,6 +408,370 @@ class UserActivityLogModelTest(TestCase):
         self.assertEqual(logs[1], log1)
 
 
+class ListRedis:
+    """Just enough of a Redis client (lists, counters, SET NX, pipelines) for flush_activity_logs."""
+
+    def __init__(self, lists=None):
+        self.lists = {key: list(values) for key, values in (lists or {}).items()}
+        self.values = {}
+
+    def _drop_empty(self):
+        self.lists = {key: values for key, values in self.lists.items() if values}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+            self.values.pop(key, None)
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    def lrange(self, key, start, end):
+        values = self.lists.get(key, [])
+        return list(values[start:] if end == -1 else values[start:end + 1])
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lrange(key, start, end)
+        self._drop_empty()
+
+    def lmove(self, source, destination, src='LEFT', dest='RIGHT'):
+        if not self.lists.get(source):
+            return None
+        value = self.lists[source].pop(0)
+        self.rpush(destination, value)
+        self._drop_empty()
+        return value
+
+    def pipeline(self):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            def execute(self):
+                return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+        return Pipeline()
+
+
+class BufferedActivityLogTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='audited', email='audited@example.com', role='buyer')
+        self.queue = cache.make_key(ACTIVITY_LOG_QUEUE)
+
+    @patch('accounts.security.get_redis_connection')
+    def test_activity_is_queued_instead_of_inserted(self, get_conn):
+        log_user_activity(self.user, 'LOGIN', 'User logged in')
+
+        key, payload = get_conn.return_value.rpush.call_args.args
+        self.assertEqual(key, cache.make_key(ACTIVITY_LOG_QUEUE))
+        self.assertEqual(json.loads(payload)['user_id'], self.user.pk)
+        self.assertFalse(UserActivityLog.objects.exists())
+
+    def test_activity_written_directly_without_redis(self):
+        log_user_activity(self.user, 'LOGIN', 'User logged in')
+        self.assertEqual(UserActivityLog.objects.get().action, 'LOGIN')
+
+    def queued_event(self, user_id, action='LOGIN', created_at=None):
+        return json.dumps({
+            'user_id': user_id, 'action': action, 'description': 'User logged in',
+            'ip_address': '10.0.0.1', 'user_agent': '', 'metadata': {},
+            'created_at': (created_at or timezone.now()).isoformat(),
+        })
+
+    def flush(self, redis):
+        with patch('accounts.tasks.get_redis_connection', return_value=redis):
+            return flush_activity_logs()
+
+    def test_flush_bulk_inserts_queued_events(self):
+        created_at = timezone.now() - timedelta(seconds=5)
+        redis = ListRedis({self.queue: [self.queued_event(self.user.pk, created_at=created_at)] * 2})
+
+        # One query to drop events of deleted users, one INSERT
+        with self.assertNumQueries(2):
+            self.assertEqual(self.flush(redis), 2)
+        self.assertEqual(UserActivityLog.objects.filter(created_at=created_at).count(), 2)
+        self.assertEqual(redis.lists, {})
+
+    def test_flush_skips_events_of_deleted_users(self):
+        redis = ListRedis({self.queue: [self.queued_event(self.user.pk), self.queued_event(self.user.pk + 100)]})
+
+        self.assertEqual(self.flush(redis), 1)
+        self.assertEqual(UserActivityLog.objects.get().user, self.user)
+
+    def test_malformed_events_are_dead_lettered_and_the_rest_written(self):
+        bad = [
+            'not json',
+            json.dumps({'user_id': self.user.pk, 'action': 'LOGIN', 'bogus': 1, 'created_at': timezone.now().isoformat()}),
+            self.queued_event(self.user.pk).replace(timezone.now().isoformat()[:4], 'xxxx', 1),
+        ]
+        redis = ListRedis({self.queue: [self.queued_event(self.user.pk, 'LOGIN'), *bad,
+                                        self.queued_event(self.user.pk, 'LOGOUT')]})
+
+        self.assertEqual(self.flush(redis), 2)
+        self.assertEqual(sorted(UserActivityLog.objects.values_list('action', flat=True)), ['LOGIN', 'LOGOUT'])
+        self.assertEqual(redis.lists, {f'{self.queue}:dead': bad})
+
+    def test_failed_flush_keeps_the_batch_for_the_next_run(self):
+        entries = [self.queued_event(self.user.pk, 'LOGIN'), self.queued_event(self.user.pk, 'LOGOUT')]
+        redis = ListRedis({self.queue: list(entries)})
+
+        with patch.object(UserActivityLog.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.flush(redis)
+        self.assertEqual(redis.lists, {f'{self.queue}:processing': entries})
+
+        # A newer event waits behind the batch being retried
+        redis.rpush(self.queue, self.queued_event(self.user.pk, 'PROFILE_UPDATE'))
+        self.assertEqual(self.flush(redis), 2)
+        self.assertEqual(self.flush(redis), 1)
+        self.assertEqual(UserActivityLog.objects.count(), 3)
+        self.assertEqual(redis.lists, {})
+
+    def test_batch_dead_lettered_after_repeated_failures(self):
+        entries = [self.queued_event(self.user.pk)]
+        redis = ListRedis({self.queue: list(entries)})
+
+        with patch.object(UserActivityLog.objects, 'bulk_create', side_effect=DatabaseError):
+            for _ in range(ACTIVITY_LOG_MAX_ATTEMPTS - 1):
+                with self.assertRaises(DatabaseError):
+                    self.flush(redis)
+            self.assertEqual(self.flush(redis), 0)
+        self.assertEqual(redis.lists, {f'{self.queue}:dead': entries})
+
+
+class CacheUserPermissionsTest(TestCase):
+    def test_vendor_without_profile_gets_unverified_defaults(self):
+        user = User.objects.create_user(username='noprofile', email='noprofile@example.com', role='vendor')
+        VendorProfile.objects.filter(user=user).delete()
+        user.refresh_from_db()
+
+        permissions = cache_user_permissions(user)
+
+        self.assertFalse(permissions['is_verified_vendor'])
+        self.assertEqual(permissions['commission_rate'], 0.0)
+
+
+class UserCacheVersionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidation_retires_every_key_for_the_user(self):
+        permissions_key = generate_cache_key('permissions', 7)
+        profile_key = generate_cache_key('profile', 7)
+        other_key = generate_cache_key('profile', 8)
+
+        invalidate_user_cache(7)
+
+        self.assertNotEqual(generate_cache_key('permissions', 7), permissions_key)
+        self.assertNotEqual(generate_cache_key('profile', 7), profile_key)
+        self.assertEqual(generate_cache_key('profile', 8), other_key)
+
+    def test_invalidation_without_a_version_still_changes_keys(self):
+        key = generate_cache_key('profile', 7)
+        cache.delete('uv:{7}')
+        invalidate_user_cache(7)
+        self.assertNotEqual(generate_cache_key('profile', 7), key)
+
+
+class CachedUserPermissionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cachedperm', email='cachedperm@example.com', role='buyer')
+
+    def test_permissions_reused_until_invalidated(self):
+        self.assertTrue(get_cached_user_permissions(self.user)['is_buyer'])
+        self.user.role = 'vendor'
+        self.assertTrue(get_cached_user_permissions(self.user)['is_buyer'])
+
+        invalidate_user_cache(self.user.id)
+        self.assertFalse(get_cached_user_permissions(self.user)['is_buyer'])
+
+    def test_role_change_is_written_through(self):
+        get_cached_user_permissions(self.user)
+        self.user.role = 'vendor'
+        self.user.save()
+
+        with patch('accounts.security.cache_user_permissions') as recompute:
+            self.assertTrue(get_cached_user_permissions(self.user)['is_vendor'])
+            recompute.assert_not_called()
+
+    def test_hot_user_served_from_process_copy(self):
+        get_cached_user_permissions(self.user)
+        with patch('accounts.security.cache') as shared_cache:
+            self.assertTrue(get_cached_user_permissions(self.user)['is_buyer'])
+            self.assertEqual(shared_cache.method_calls, [])
+
+    def test_concurrent_misses_rebuild_once(self):
+        import threading
+        from accounts import security
+
+        cache.clear()
+        release = threading.Event()
+        real_build = security._build_permissions
+
+        def slow_build(user):
+            release.wait(1)
+            return real_build(user)
+
+        results = []
+        with patch('accounts.security._build_permissions', side_effect=slow_build) as build:
+            readers = [
+                threading.Thread(target=lambda: results.append(get_cached_user_permissions(self.user)))
+                for _ in range(4)
+            ]
+            for reader in readers:
+                reader.start()
+            release.set()
+            for reader in readers:
+                reader.join()
+
+        self.assertEqual(build.call_count, 1)
+        self.assertTrue(all(permissions['is_buyer'] for permissions in results))
+        self.assertEqual(len(results), 4)
+
+    def test_unrelated_save_keeps_cached_permissions(self):
+        key = generate_cache_key('permissions', self.user.id)
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(generate_cache_key('permissions', self.user.id), key)
+
+    def test_miss_caches_under_the_current_version(self):
+        cache.set(f'uv:{{{self.user.id}}}', 5, None)
+
+        get_cached_user_permissions(self.user)
+
+        self.assertTrue(cache.get(f'afrobuy:permissions:{{{self.user.id}}}:v5')['is_buyer'])
+
+
+class CheckRateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_allows_up_to_limit(self):
+        results = [check_rate_limit('register:10.0.0.1', 3, 300) for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+    @patch('accounts.security.get_redis_connection')
+    def test_redis_counter_incremented_atomically(self, get_conn):
+        pipe = get_conn.return_value.pipeline.return_value
+        pipe.execute.return_value = [4, False]
+
+        self.assertFalse(check_rate_limit('register:10.0.0.1', 3, 300))
+        pipe.incr.assert_called_once_with(cache.make_key('register:10.0.0.1'))
+        pipe.expire.assert_called_once_with(cache.make_key('register:10.0.0.1'), 300, nx=True)
+
+
+class SuspiciousActivityTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = APIRequestFactory().post(
+            '/api/auth/login/', REMOTE_ADDR='10.0.0.9', HTTP_USER_AGENT='Mozilla/5.0 (X11; Linux)'
+        )
+
+    def _user(self, n):
+        return User.objects.create_user(username=f'shared{n}', email=f'shared{n}@example.com', role='buyer')
+
+    def test_sixth_user_from_one_ip_is_flagged(self):
+        results = [is_suspicious_activity(self._user(n), self.request) for n in range(6)]
+        self.assertEqual(results, [False] * 5 + [True])
+
+    def test_fifth_login_within_window_is_flagged(self):
+        user = self._user(0)
+        results = [is_suspicious_activity(user, self.request) for _ in range(5)]
+        self.assertEqual(results, [False] * 4 + [True])
+
+    def test_audit_rows_capped_while_detection_continues(self):
+        user = self._user(0)
+        results = [is_suspicious_activity(user, self.request) for _ in range(12)]
+
+        self.assertTrue(all(results[4:]))
+        self.assertEqual(UserActivityLog.objects.filter(action='SUSPICIOUS_ACTIVITY').count(), 5)
+
+    @patch('accounts.security.get_redis_connection')
+    def test_ip_users_counted_server_side(self, get_conn):
+        pipe = get_conn.return_value.pipeline.return_value
+        pipe.execute.side_effect = [[1, 6, False], [1, False], [1, False]]
+
+        self.assertTrue(is_suspicious_activity(self._user(0), self.request))
+        pipe.pfadd.assert_called_once_with(cache.make_key('ip_users:10.0.0.9'), 'shared0')
+
+
+class SecureHashTest(TestCase):
+    def test_round_trip_and_mismatch(self):
+        hashed = secure_hash('1234')
+        self.assertTrue(verify_secure_hash('1234', hashed))
+        self.assertFalse(verify_secure_hash('4321', hashed))
+        self.assertFalse(verify_secure_hash('1234', 'malformed'))
+
+    def test_legacy_pbkdf2_hashes_still_verify(self):
+        salt = 'ab' * 16
+        legacy = hashlib.pbkdf2_hmac('sha256', b'1234', salt.encode(), 100000).hex() + ':' + salt
+        self.assertTrue(verify_secure_hash('1234', legacy))
+        self.assertFalse(verify_secure_hash('4321', legacy))
+
+
+class SecurityMiddlewareTest(TestCase):
+    def test_headers_added_without_overriding_the_view(self):
+        def view(request):
+            response = HttpResponse()
+            response['X-Frame-Options'] = 'SAMEORIGIN'
+            return response
+
+        response = SecurityMiddleware(view)(APIRequestFactory().get('/'))
+
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(response['Referrer-Policy'], 'strict-origin-when-cross-origin')
+        self.assertEqual(response['X-Frame-Options'], 'SAMEORIGIN')
+
+
+class CleanAndValidateInputTest(TestCase):
+    def test_phone_keeps_only_digits_and_localizes(self):
+        cleaned = clean_and_validate_input({'phone': ' 0770-123 456 '}, {'phone': {'type': 'phone'}})
+        self.assertEqual(cleaned['phone'], '+256770123456')
+
+    def test_compiled_validator_is_reused_and_checks_lengths(self):
+        rules = {'email': {'type': 'email', 'max_length': 20}, 'name': {'min_length': 3}}
+        validate = build_validator(rules)
+
+        self.assertIs(build_validator(rules), validate)
+        self.assertEqual(
+            validate({'email': ' A@B.CO ', 'name': 'Ann', 'extra': 'dropped'}),
+            {'email': 'a@b.co', 'name': 'Ann'},
+        )
+        with self.assertRaisesMessage(ValueError, 'name must be at least 3 characters'):
+            validate({'name': 'Al'})
+
+    def test_phone_with_non_ascii_characters(self):
+        cleaned = clean_and_validate_input({'phone': '+256 770 é123456'}, {'phone': {'type': 'phone'}})
+        self.assertEqual(cleaned['phone'], '256770123456')
+
+
+class PruneActivityLogsCommandTest(TestCase):
+    def test_only_logs_past_retention_are_deleted(self):
+        user = User.objects.create_user(username='pruned', email='pruned@example.com', role='buyer')
+        old = UserActivityLog.objects.create(user=user, action='LOGIN', description='old login')
+        UserActivityLog.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=200))
+        recent = UserActivityLog.objects.create(user=user, action='LOGIN', description='recent login')
+
+        call_command('prune_activity_logs', days=180, batch_size=1, stdout=StringIO())
+
+        self.assertEqual(list(UserActivityLog.objects.values_list('pk', flat=True)), [recent.pk])
+
+
 class ArchiveUserModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -310,6 +808,44 @@ class UserRegistrationSerializerTest(TestCase):
         serializer = UserRegistrationSerializer(data=self.valid_data)
         self.assertTrue(serializer.is_valid())
 
+    def test_phone_separators_are_stripped(self):
+        for phone in ('+256 (700) 123-456', '+256\u00a0700\u2013123\u2013456'):
+            serializer = UserRegistrationSerializer(data=dict(self.valid_data, phone=phone))
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            self.assertEqual(serializer.validated_data['phone'], '+256700123456')
+
+    def test_non_ascii_digits_are_not_a_phone_number(self):
+        data = dict(self.valid_data, phone='+\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669\u0660')
+        serializer = UserRegistrationSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('phone', serializer.errors)
+
+    def test_username_taken_by_phone_gets_next_free_suffix(self):
+        User.objects.create_user(username='+1234567890', email='first@example.com', role='buyer')
+        User.objects.create_user(username='+1234567890_1', email='second@example.com', role='buyer')
+
+        serializer = UserRegistrationSerializer(data=self.valid_data)
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.save().username, '+1234567890_2')
+
+    def test_longer_usernames_sharing_the_prefix_are_ignored(self):
+        User.objects.create_user(username='+1234567890', email='first@example.com', role='buyer')
+        User.objects.create_user(username='+1234567890_7', email='second@example.com', role='buyer')
+        User.objects.create_user(username='+12345678901_9', email='third@example.com', role='buyer')
+
+        serializer = UserRegistrationSerializer(data=self.valid_data)
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.save().username, '+1234567890_8')
+
+    def test_failed_profile_creation_rolls_back_the_user(self):
+        serializer = UserRegistrationSerializer(data=self.valid_data)
+        self.assertTrue(serializer.is_valid())
+
+        with patch.object(BuyerProfile.objects, 'create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                serializer.save()
+        self.assertFalse(User.objects.filter(phone='+1234567890').exists())
+
     def test_password_mismatch(self):
         data = self.valid_data.copy()
         data['confirm_password'] = 'DifferentPassword123!'
@@ -347,31 +883,184 @@ class UserLoginSerializerTest(TestCase):
             role='buyer'
         )
 
-    @patch('accounts.serializers.authenticate')
-    def test_valid_login(self, mock_authenticate):
-        mock_authenticate.return_value = self.user
-        
+    def test_valid_login(self):
         data = {
             'username': 'testuser',
             'password': 'testpassword123'
         }
         
         serializer = UserLoginSerializer(data=data)
-        if hasattr(serializer, 'is_valid'):
+        with self.assertNumQueries(1):
             self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['user']['id'], self.user.id)
 
-    @patch('accounts.serializers.authenticate')
-    def test_invalid_credentials(self, mock_authenticate):
-        mock_authenticate.return_value = None
-        
+    def test_login_reads_no_deferred_fields(self):
+        User.objects.filter(pk=self.user.pk).update(login_attempts=2)
+        # Select, counter UPDATE, re-read of the counter / select, reset UPDATE
+        for password, queries in (('wrongpassword', 3), ('testpassword123', 2)):
+            serializer = UserLoginSerializer(data={'username': 'testuser', 'password': password})
+            with self.assertNumQueries(queries):
+                serializer.is_valid()
+
+    def test_invalid_credentials(self):
         data = {
             'username': 'testuser',
             'password': 'wrongpassword'
         }
         
         serializer = UserLoginSerializer(data=data)
-        if hasattr(serializer, 'is_valid'):
+        self.assertFalse(serializer.is_valid())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_attempts, 1)
+
+    def test_valid_login_clears_failed_attempts(self):
+        User.objects.filter(pk=self.user.pk).update(login_attempts=3)
+        serializer = UserLoginSerializer(data={'username': 'testuser', 'password': 'testpassword123'})
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.login_attempts, 0)
+
+    def test_inactive_user_cannot_log_in(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        serializer = UserLoginSerializer(data={'username': 'testuser', 'password': 'testpassword123'})
+        self.assertFalse(serializer.is_valid())
+
+    def test_unknown_username_still_runs_the_hasher(self):
+        serializer = UserLoginSerializer(data={'username': 'nobody', 'password': 'whatever123'})
+        with patch('django.contrib.auth.base_user.make_password', return_value='!') as hasher:
             self.assertFalse(serializer.is_valid())
+        hasher.assert_called_once_with('whatever123')
+
+    def test_failed_logins_send_the_signal(self):
+        from django.contrib.auth.signals import user_login_failed
+
+        received = []
+
+        def listener(sender, credentials, **kwargs):
+            received.append(credentials)
+
+        user_login_failed.connect(listener)
+        try:
+            for username in ('nobody', 'testuser'):
+                UserLoginSerializer(data={'username': username, 'password': 'wrongpassword'}).is_valid()
+        finally:
+            user_login_failed.disconnect(listener)
+
+        self.assertEqual(received, [{'username': 'nobody'}, {'username': 'testuser'}])
+
+
+class ProfileUpdateSerializerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='updater', email='updater@example.com', role='buyer',
+            first_name='Old', last_name='Name'
+        )
+        self.profile = BuyerProfile.objects.create(user=self.user, loyalty_tier='gold')
+        self.updated_at = self.user.updated_at
+
+    def test_update_writes_only_submitted_columns(self):
+        # Changes made elsewhere after the instance was loaded must survive
+        User.objects.filter(pk=self.user.pk).update(wallet=Decimal('50.00'))
+        BuyerProfile.objects.filter(pk=self.profile.pk).update(loyalty_tier='platinum')
+
+        serializer = ProfileUpdateSerializer(
+            self.user, data={'full_name': 'New Name', 'secondary_phone': '+256700000001'}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.full_name, 'New Name')
+        self.assertEqual(user.first_name, '')
+        self.assertEqual(user.wallet, Decimal('50.00'))
+        self.assertGreater(user.updated_at, self.updated_at)
+        profile = BuyerProfile.objects.get(pk=self.profile.pk)
+        self.assertEqual(profile.secondary_phone, '+256700000001')
+        self.assertEqual(profile.loyalty_tier, 'platinum')
+
+
+    def test_failed_profile_save_rolls_back_the_user(self):
+        serializer = ProfileUpdateSerializer(
+            self.user, data={'full_name': 'New Name', 'secondary_phone': '+256700000001'}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        with patch.object(BuyerProfile, 'save', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                serializer.save()
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Old')
+
+
+class UserDeleteSerializerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='leaver', email='leaver@example.com', password='testpassword123', role='buyer'
+        )
+        self.request = Mock(user=self.user)
+
+    def test_delete_archives_and_removes_the_user(self):
+        serializer = UserDeleteSerializer(data={'password': 'testpassword123'}, context={'request': self.request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        user_id = self.user.pk
+        serializer.save()
+
+        self.assertFalse(User.objects.filter(pk=user_id).exists())
+        self.assertTrue(ArchiveUser.objects.filter(original_user_id=user_id).exists())
+
+    def test_failed_delete_rolls_back_the_archive(self):
+        serializer = UserDeleteSerializer(data={'password': 'testpassword123'}, context={'request': self.request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        with patch.object(User, 'delete', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                serializer.save()
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(ArchiveUser.objects.exists())
+
+
+class PasswordResetVerifySerializerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='forgetful', email='forgetful@example.com', role='buyer')
+        self.reset = PasswordReset.create_fresh(self.user, 'forgetful@example.com')
+
+    def validate(self, email, code):
+        serializer = PasswordResetVerifySerializer(data={'email': email, 'verification_code': code})
+        return serializer, serializer.is_valid()
+
+    def test_valid_code_loads_reset_and_user_in_one_query(self):
+        with self.assertNumQueries(1):
+            serializer, valid = self.validate('Forgetful@example.com', self.reset.verification_code)
+            self.assertTrue(valid)
+            self.assertEqual(serializer.validated_data['user'], self.user)
+        self.assertEqual(serializer.validated_data['reset_instance'], self.reset)
+
+    def test_confirm_marks_the_reset_used(self):
+        serializer = PasswordResetConfirmSerializer(data={
+            'email': 'forgetful@example.com', 'verification_code': self.reset.verification_code,
+            'new_password': 'NewPassword123!', 'confirm_password': 'NewPassword123!',
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertTrue(PasswordReset.objects.get(pk=self.reset.pk).is_used)
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('NewPassword123!'))
+
+    def test_unknown_email_and_wrong_code_are_told_apart(self):
+        wrong_code = f"{(int(self.reset.verification_code) + 1) % 1_000_000:06d}"
+        serializer, valid = self.validate('nobody@example.com', self.reset.verification_code)
+        self.assertFalse(valid)
+        self.assertIn('Invalid email address.', serializer.errors['non_field_errors'])
+
+        serializer, valid = self.validate('forgetful@example.com', wrong_code)
+        self.assertFalse(valid)
+        self.assertIn('Invalid verification code.', serializer.errors['non_field_errors'])
+
+    def test_expired_code_is_rejected(self):
+        PasswordReset.objects.filter(pk=self.reset.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        serializer, valid = self.validate('forgetful@example.com', self.reset.verification_code)
+        self.assertFalse(valid)
+        self.assertIn('Verification code has expired.', serializer.errors['non_field_errors'])
 
 
 class AccountsViewTest(APITestCase):
@@ -431,6 +1120,56 @@ class AccountsViewTest(APITestCase):
         response = self.client.get('/api/auth/profile/')
         self.assertIn(response.status_code, [401, 403, 404])
 
+    def test_api_post_without_csrf_token(self):
+        # API paths skip the CSRF check entirely
+        client = APIClient(enforce_csrf_checks=True)
+        data = {
+            'username': 'testuser',
+            'password': 'testpassword123'
+        }
+
+        response = client.post('/api/auth/login/', data)
+        self.assertNotEqual(response.status_code, 403)
+
+    def test_non_api_post_still_requires_csrf_token(self):
+        client = APIClient(enforce_csrf_checks=True)
+        response = client.post('/admin/login/', {'username': 'testuser', 'password': 'x'})
+        self.assertEqual(response.status_code, 403)
+
+
+class UserProfileSerializerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(username='listadmin', email='listadmin@example.com', role='admin')
+        AdminProfile.objects.create(user=admin, department='IT')
+        vendor = User.objects.create_user(username='listvendor', email='listvendor@example.com', role='vendor')
+        VendorProfile.objects.create(user=vendor, business_type='Electronics')
+        User.objects.create_user(username='listbuyer', email='listbuyer@example.com', role='buyer')
+
+    def test_missing_profile_is_cached_until_one_is_created(self):
+        buyer = User.objects.get(username='listbuyer')
+        self.assertEqual(UserProfileSerializer(buyer).data['profile_data'], {})
+
+        BuyerProfile.objects.create(user=buyer, loyalty_tier='gold')
+        buyer = User.objects.get(pk=buyer.pk)
+        self.assertEqual(UserProfileSerializer(buyer).data['profile_data']['loyalty_tier'], 'gold')
+
+    def test_plain_queryset_list_is_joined_automatically(self):
+        with self.assertNumQueries(1):
+            data = UserProfileSerializer(User.objects.all(), many=True).data
+        self.assertEqual(len(data), 3)
+
+    def test_eager_loaded_list_serializes_in_one_query(self):
+        queryset = UserProfileSerializer.setup_eager_loading(User.objects.order_by('username'))
+
+        with self.assertNumQueries(1):
+            data = UserProfileSerializer(queryset, many=True).data
+
+        by_name = {row['full_name'] or row['email']: row['profile_data'] for row in data}
+        self.assertEqual(by_name['listadmin@example.com']['department'], 'IT')
+        self.assertEqual(by_name['listvendor@example.com']['business_type'], 'Electronics')
+        self.assertEqual(by_name['listbuyer@example.com'], {})
+
 
 class AddEmailSerializerTest(TestCase):
     def setUp(self):
@@ -463,6 +1202,20 @@ class AddEmailSerializerTest(TestCase):
         self.assertIn('email', serializer.errors)
 
 
+class SendEmailTaskTest(TestCase):
+    def test_send_email_task_sends_html_message(self):
+        result = send_email_task.apply(
+            args=('buyer@example.com', 'Welcome', '<h1>Hello</h1><p>Welcome aboard</p>')
+        )
+
+        self.assertTrue(result.get())
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['buyer@example.com'])
+        self.assertEqual(message.body, 'HelloWelcome aboard')
+        self.assertEqual(message.alternatives[0][1], 'text/html')
+
+
 class UserSecurityTest(TransactionTestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -507,3 +1260,177 @@ class UserSecurityTest(TransactionTestCase):
         self.assertTrue(verification.verified)
         self.user.refresh_from_db()
         self.assertTrue(self.user.email_verified)
+
+
+class CookieJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cookieuser',
+            email='cookie@example.com',
+            role='buyer'
+        )
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.factory = APIRequestFactory()
+        self.auth = CookieJWTAuthentication()
+
+    def test_cookie_token_cached_between_requests(self):
+        request = self.factory.get('/api/auth/status/')
+        request.COOKIES['access_token'] = self.token
+
+        user, validated_token = self.auth.authenticate(request)
+        self.assertEqual(user.id, self.user.id)
+
+        # Second request with the same token skips validation and the user lookup
+        with self.assertNumQueries(0):
+            cached_user, cached_token = self.auth.authenticate(request)
+        self.assertEqual(cached_user.id, self.user.id)
+        self.assertEqual(cached_token['user_id'], validated_token['user_id'])
+
+    def test_requests_never_share_user_objects(self):
+        BuyerProfile.objects.create(user=self.user, loyalty_tier='bronze')
+        request = self.factory.get('/api/auth/status/')
+        request.COOKIES['access_token'] = self.token
+
+        first, _ = self.auth.authenticate(request)
+        first.first_name = 'Changed'
+        first.buyer_profile.loyalty_tier = 'gold'
+
+        second, _ = self.auth.authenticate(request)
+        self.assertNotEqual(second.first_name, 'Changed')
+        self.assertEqual(second.buyer_profile.loyalty_tier, 'bronze')
+
+    def test_forgotten_token_is_rejected_everywhere(self):
+        request = self.factory.get('/api/auth/status/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        _, validated_token = self.auth.authenticate(request)
+
+        forget_token(validated_token)
+        # A worker that never saw the logout still has the token cached in-process
+        authentication._token_cache[authentication._token_cache_key(self.token)] = (time.time() + 30, validated_token)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate(request)
+
+    def test_deactivation_applies_to_cached_tokens(self):
+        request = self.factory.get('/api/auth/status/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.auth.authenticate(request)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_cached_user(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate(request)
+
+    def test_profiles_loaded_with_user(self):
+        BuyerProfile.objects.create(user=self.user)
+        request = self.factory.get('/api/auth/status/')
+        request.COOKIES['access_token'] = self.token
+
+        with self.assertNumQueries(1):
+            user, _ = self.auth.authenticate(request)
+            self.assertIsNotNone(user.buyer_profile)
+            self.assertFalse(hasattr(user, 'vendor_profile'))
+
+    def test_invalid_cookie_token_returns_none(self):
+        request = self.factory.get('/api/auth/status/')
+        request.COOKIES['access_token'] = 'not-a-jwt'
+        self.assertIsNone(self.auth.authenticate(request))
+
+    def test_cookie_for_inactive_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        request = self.factory.get('/api/auth/status/')
+        request.COOKIES['access_token'] = self.token
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate(request)
+
+    def test_cache_outage_falls_back_to_database(self):
+        request = self.factory.get('/api/auth/status/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with patch.object(cache, 'get_many', side_effect=ConnectionError), \
+                patch.object(cache, 'set', side_effect=ConnectionError):
+            with self.assertNumQueries(1):
+                user, _ = self.auth.authenticate(request)
+        self.assertEqual(user.id, self.user.id)
+
+    def test_user_save_invalidates_cached_user(self):
+        request = self.factory.get('/api/auth/status/')
+        request.COOKIES['access_token'] = self.token
+        self.auth.authenticate(request)
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+
+        # Saving the user drops both the token entry and the shared user entry
+        with self.assertNumQueries(1):
+            user, _ = self.auth.authenticate(request)
+        self.assertEqual(user.first_name, 'Renamed')
+
+
+class RolePermissionTest(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.buyer = User.objects.create_user(username='perm_buyer', email='perm_buyer@example.com', role='buyer')
+
+    def _request(self, method, data=None):
+        request = Request(
+            getattr(self.factory, method)('/api/auth/profile/', data, format='json'),
+            parsers=[JSONParser()],
+        )
+        request.user = self.buyer
+        return request
+
+    def test_role_escalation_and_vendor_creation_share_one_body_read(self):
+        request = self._request('post', {'role': 'vendor'})
+
+        self.assertFalse(PreventRoleEscalation().has_permission(request, None))
+        with patch.object(Request, 'data', new_callable=PropertyMock) as data:
+            self.assertFalse(CanCreateVendor().has_permission(request, None))
+            data.assert_not_called()
+
+    def test_request_without_role_is_allowed(self):
+        request = self._request('patch', {'location': 'Kampala'})
+        self.assertTrue(PreventRoleEscalation().has_permission(request, None))
+        self.assertTrue(CanCreateVendor().has_permission(request, None))
+
+    def test_null_role_still_counts_as_sending_a_role(self):
+        request = self._request('patch', {'role': None})
+        self.assertFalse(PreventRoleEscalation().has_permission(request, None))
+
+    def test_reads_and_deletes_never_parse_the_body(self):
+        for method in ('get', 'delete'):
+            request = self._request(method)
+            with patch.object(Request, 'data', new_callable=PropertyMock) as data:
+                self.assertTrue(PreventRoleEscalation().has_permission(request, None))
+                data.assert_not_called()
+
+
+class RateLimitPermissionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.view = Mock(throttle_scope='login')
+        self.request = APIRequestFactory().post('/api/auth/login/', REMOTE_ADDR='10.0.0.1')
+
+    def test_requests_over_the_limit_are_denied(self):
+        permission = RateLimitPermission()
+        results = [permission.has_permission(self.request, self.view) for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+
+    @patch('accounts.permissions.get_redis_connection')
+    def test_redis_window_counted_in_one_pipeline(self, get_conn):
+        pipe = get_conn.return_value.pipeline.return_value
+        pipe.execute.return_value = [0, 1, 6, True]
+
+        self.assertFalse(RateLimitPermission().has_permission(self.request, self.view))
+        pipe.execute.assert_called_once()
+        digest = hashlib.blake2b(b'10.0.0.1', digest_size=8).hexdigest()
+        pipe.zcard.assert_called_once_with(cache.make_key(f'rl:login:{digest}'))
+        # The rejected hit is taken back out of the window
+        member = pipe.zadd.call_args.args[1]
+        get_conn.return_value.zrem.assert_called_once_with(cache.make_key(f'rl:login:{digest}'), *member)
+
+    def test_rejected_requests_do_not_extend_the_lockout(self):
+        permission = RateLimitPermission()
+        for _ in range(10):
+            permission.has_permission(self.request, self.view)
+        digest = hashlib.blake2b(b'10.0.0.1', digest_size=8).hexdigest()
+        self.assertEqual(cache.get(f'rl:login:{digest}'), 5)
+
+    def test_views_without_scope_are_not_limited(self):
+        view = Mock(spec=[])
+        self.assertTrue(RateLimitPermission().has_permission(self.request, view))
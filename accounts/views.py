@@ -66,6 +66,7 @@ from .security import (
 )
 
 from .tasks import send_verification_email_task, send_password_reset_email_task
+from .authentication import forget_token
 
 # One email per minute per user + email
 RATE_LIMIT_SECONDS = 60 
@@ -314,6 +315,10 @@ class UserLogoutView(APIView):
             if refresh_token:
                 token = RefreshToken(refresh_token)
                 token.blacklist()
+
+            # Revoke the access token on every worker, not just this one
+            if request.auth is not None:
+                forget_token(request.auth)
             
             # Log logout
             log_user_activity(
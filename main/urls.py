@@ -17,13 +17,14 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from APIHealth.views import health_check
+from APIHealth.views import alive, health_check
 
 urlpatterns = [
     # Server root page view
     path("", include("home_page.urls")),
     path("admin/", admin.site.urls),
-    # Health check
+    # Health check (liveness and readiness)
+    path("-/alive/", alive, name="alive"),
     path("health/", health_check, name="health-check"),
     # authentication
     path("api/auth/", include("accounts.urls")),